@@ -0,0 +1,118 @@
+"""
+Чтение с реплик базы данных.
+
+Реплики перечисляются в DATABASE_REPLICAS. На них уходят только чтения
+безопасных запросов к представлениям с ReplicaReadMixin, всё остальное,
+в том числе запись и чтение внутри транзакций, выполняется в default.
+
+Реплики отстают от основной базы, поэтому после успешного изменяющего
+запроса пользователь на REPLICA_PIN_SECONDS закрепляется за default
+и сразу видит свои изменения. Общие кеши и индексы в памяти заполняются
+из default через use_primary, чтобы не закешировать отставшие данные.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_KEY = 'replica_pin:{}'
+
+current_replica = ContextVar('current_replica', default=None)
+
+
+def pin_to_primary(user_id):
+    cache.set(PIN_KEY.format(user_id), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    """Проверяет, должен ли пользователь читать из основной базы."""
+    return user.is_authenticated and cache.get(PIN_KEY.format(user.id), False)
+
+
+@contextmanager
+def use_replica(alias):
+    """Направляет чтения на реплику alias, None — на основную базу."""
+    token = current_replica.set(alias)
+    try:
+        yield
+    finally:
+        current_replica.reset(token)
+
+
+def use_primary():
+    return use_replica(None)
+
+
+def choose_replica(user):
+    """
+    Выбирает реплику для запроса пользователя или None, если реплик нет
+    или пользователь закреплён за основной базой.
+
+    Реплика выбирается одна на весь запрос, чтобы количество
+    и страница списка читались с одного сервера.
+    """
+    replicas = settings.DATABASE_REPLICAS
+    if not replicas or is_pinned(user):
+        return None
+    return random.choice(replicas)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = current_replica.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaReadMixin:
+    """
+    Выполняет безопасные запросы представления на реплике.
+
+    Реплика выбирается после аутентификации, поэтому пользователь,
+    недавно изменявший данные, читает из основной базы.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            self._replica_token = current_replica.set(
+                choose_replica(request.user))
+
+    def dispatch(self, request, *args, **kwargs):
+        self._replica_token = None
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self._replica_token is not None:
+                current_replica.reset(self._replica_token)
+
+
+class PrimaryPinMiddleware:
+    """Закрепляет за основной базой пользователей после записи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, 'user', None)
+        if (settings.DATABASE_REPLICAS
+                and request.method not in SAFE_METHODS
+                and response.status_code < 400
+                and user is not None and user.is_authenticated):
+            pin_to_primary(user.id)
+        return response
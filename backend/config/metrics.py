@@ -0,0 +1,242 @@
+"""
+Метрики запросов к API в формате Prometheus.
+
+MetricsMiddleware для каждого представления и действия (view, action)
+собирает гистограммы общего времени ответа, числа SQL-запросов, времени
+в базе и времени сериализации. Метрики хранятся в памяти процесса,
+поэтому при нескольких воркерах каждый отдаёт свои значения.
+"""
+import hmac
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+from itertools import chain
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SLOW_REQUEST_TOP_SQL = 5
+
+current_stats = ContextVar('request_stats', default=None)
+
+
+def format_labels(labels):
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\')
+                         .replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels)
+
+
+class Histogram:
+    """Гистограмма с метками, накапливающая значения по корзинам."""
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [
+                    [0] * len(self.buckets), 0.0, 0]
+            buckets = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    buckets[index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(
+                (labels, list(buckets), total, count)
+                for labels, (buckets, total, count) in self._series.items())
+        for labels, buckets, total, count in series:
+            text = format_labels(labels)
+            for bound, value in zip(self.buckets, buckets):
+                lines.append(f'{self.name}_bucket{{{text},le="{bound}"}} '
+                             f'{value}')
+            lines.append(f'{self.name}_bucket{{{text},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{text}}} {total}')
+            lines.append(f'{self.name}_count{{{text}}} {count}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    'api_request_duration_seconds', 'Полное время обработки запроса.',
+    SECONDS_BUCKETS)
+DB_QUERIES = Histogram(
+    'api_request_db_queries', 'Число SQL-запросов за запрос.',
+    QUERIES_BUCKETS)
+DB_SECONDS = Histogram(
+    'api_request_db_duration_seconds', 'Время выполнения SQL за запрос.',
+    SECONDS_BUCKETS)
+SERIALIZER_SECONDS = Histogram(
+    'api_request_serializer_duration_seconds',
+    'Время сериализации ответа без учёта SQL.', SECONDS_BUCKETS)
+HISTOGRAMS = (REQUEST_SECONDS, DB_QUERIES, DB_SECONDS, SERIALIZER_SECONDS)
+
+
+class RequestStats:
+    """
+    Статистика одного запроса.
+
+    Экземпляр подключается к соединениям с базой как execute_wrapper
+    и считает SQL-запросы и время их выполнения.
+    """
+
+    def __init__(self, collect_statements=False):
+        self.view = 'unresolved'
+        self.action = ''
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.statements = Counter() if collect_statements else None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            if self.statements is not None:
+                self.statements[sql] += 1
+
+    @property
+    def labels(self):
+        return (('view', self.view), ('action', self.action))
+
+
+def instrument_serializers():
+    """
+    Засекает время получения data у сериализаторов верхнего уровня.
+
+    Вложенные сериализаторы учитываются во времени внешнего,
+    а SQL, выполненный во время сериализации, из него вычитается.
+    """
+    original = BaseSerializer.data.fget
+    if getattr(original, 'instrumented', False):
+        return
+
+    def data(serializer):
+        stats = current_stats.get()
+        if stats is None or stats.serializer_depth:
+            return original(serializer)
+        stats.serializer_depth += 1
+        sql_time = stats.sql_time
+        start = time.perf_counter()
+        try:
+            return original(serializer)
+        finally:
+            stats.serializer_depth -= 1
+            stats.serializer_time += (time.perf_counter() - start
+                                      - (stats.sql_time - sql_time))
+
+    data.instrumented = True
+    BaseSerializer.data = property(data)
+
+
+def view_labels(request, view_func):
+    """Возвращает имя представления и действие для меток метрик."""
+    view_class = getattr(view_func, 'cls', None)
+    method = request.method.lower()
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}', method
+    actions = getattr(view_func, 'actions', None) or {}
+    return view_class.__name__, actions.get(method, method)
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики запросов и пишет в журнал медленные запросы.
+
+    Если задан SLOW_REQUEST_THRESHOLD (в секундах), запросы дольше
+    порога попадают в журнал вместе с самыми частыми SQL-запросами.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument_serializers()
+
+    def __call__(self, request):
+        threshold = settings.SLOW_REQUEST_THRESHOLD
+        stats = RequestStats(collect_statements=bool(threshold))
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        duration = time.perf_counter() - start
+
+        labels = stats.labels
+        REQUEST_SECONDS.observe(labels, duration)
+        DB_QUERIES.observe(labels, stats.queries)
+        DB_SECONDS.observe(labels, stats.sql_time)
+        SERIALIZER_SECONDS.observe(labels, stats.serializer_time)
+        if threshold and duration >= threshold:
+            self.log_slow_request(request, response, stats, duration)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = current_stats.get()
+        if stats is not None:
+            stats.view, stats.action = view_labels(request, view_func)
+
+    @staticmethod
+    def log_slow_request(request, response, stats, duration):
+        statements = '\n'.join(
+            f'  {count} x {sql}'
+            for sql, count in stats.statements.most_common(
+                SLOW_REQUEST_TOP_SQL))
+        logger.warning(
+            'Медленный запрос %s %s (%s.%s) -> %s: %.3f с, '
+            'SQL: %d запросов за %.3f с, сериализация %.3f с\n%s',
+            request.method, request.get_full_path(), stats.view,
+            stats.action, response.status_code, duration, stats.queries,
+            stats.sql_time, stats.serializer_time, statements)
+
+
+def has_metrics_access(request):
+    """
+    Метрики видны с токеном METRICS_TOKEN в заголовке Authorization
+    (Bearer) или администраторам. Без настроенного токена и без входа
+    администратора доступ закрыт.
+    """
+    token = settings.METRICS_TOKEN
+    if token and hmac.compare_digest(
+            request.META.get('HTTP_AUTHORIZATION', '').encode(),
+            f'Bearer {token}'.encode()):
+        return True
+    return request.user.is_staff
+
+
+def metrics(request):
+    """Отдаёт метрики в текстовом формате Prometheus."""
+    if not has_metrics_access(request):
+        return HttpResponseForbidden()
+    lines = chain.from_iterable(
+        histogram.expose() for histogram in HISTOGRAMS)
+    return HttpResponse('\n'.join(lines) + '\n',
+                        content_type='text/plain; version=0.0.4')
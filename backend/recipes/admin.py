@@ -13,11 +13,24 @@ class IngredientResource(resources.ModelResource):
         report_skipped = True
 
 
+class RecipeTagInline(admin.TabularInline):
+    """Теги рецепта на странице рецепта в админке"""
+    model = models.RecipeTag
+    extra = 1
+
+
 @admin.register(models.Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     """Модель предназначена для отображения модели рецептов в админке"""
-    list_display = ('id', 'name', 'author')
+    inlines = (RecipeTagInline,)
+    list_display = ('id', 'name', 'author', 'favorites_count')
     list_display_links = ('id', 'name', 'author')
+    readonly_fields = ('favorites_count',)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        models.Recipe.objects.filter(
+            pk=form.instance.pk).update_search_vector()
 
 
 @admin.register(models.Tag)
@@ -0,0 +1,95 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from config.db_router import use_primary
+
+VERSION_KEY = 'version:{}'
+
+
+def initial_version():
+    """
+    Начальная версия набора данных: время в наносекундах. Если счётчик
+    пропал из кеша (перезапуск процесса или вытеснение), новая версия
+    не совпадёт ни с одной из выданных раньше, и старые ETag и ключи
+    кеша не подойдут к новым данным.
+    """
+    return time.time_ns()
+
+
+def get_version(name):
+    """Возвращает текущую версию набора данных name."""
+    return get_versions([name])[name]
+
+
+def get_versions(names):
+    """Возвращает версии нескольких наборов данных за одно обращение."""
+    keys = {name: VERSION_KEY.format(name) for name in names}
+    versions = cache.get_many(list(keys.values()))
+    missing = [key for key in keys.values() if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, initial_version(), None)
+        versions.update(cache.get_many(missing))
+    return {name: versions[key] for name, key in keys.items()}
+
+
+def bump_version(name):
+    """
+    Увеличивает версию набора данных name, сбрасывая зависимые кеши.
+
+    Возвращает новую версию.
+    """
+    key = VERSION_KEY.format(name)
+    cache.add(key, initial_version(), None)
+    return cache.incr(key)
+
+
+class VersionedCacheMixin:
+    """
+    Кеширует сериализованный ответ list по версии данных.
+
+    Ключ кеша и ETag строятся из версии cache_version_name и параметров
+    запроса, поэтому клиент с актуальным ETag получает 304 без обращения
+    к базе и сериализации.
+    """
+    cache_version_name = None
+    cache_max_age = settings.REFERENCE_CACHE_MAX_AGE
+
+    def get_cache_key(self, request):
+        query = '&'.join(sorted(
+            f'{key}={value}'
+            for key, values in request.query_params.lists()
+            for value in values))
+        digest = hashlib.md5(query.encode()).hexdigest()
+        version = get_version(self.cache_version_name)
+        return f'{self.cache_version_name}:{version}:{digest}'
+
+    def finalize_cached_response(self, response, etag):
+        response['ETag'] = etag
+        patch_cache_control(response, public=True,
+                            max_age=self.cache_max_age)
+        return response
+
+    def get_list_data(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs).data
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        etag = quote_etag(key)
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            return self.finalize_cached_response(
+                Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+        data = cache.get(key)
+        if data is None:
+            with use_primary():
+                data = self.get_list_data(request, *args, **kwargs)
+            cache.set(key, data)
+        return self.finalize_cached_response(Response(data), etag)
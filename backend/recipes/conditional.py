@@ -0,0 +1,182 @@
+"""
+Условные запросы к рецептам: ETag и Last-Modified.
+
+Представление рецепта меняется вместе с его updated_at, который
+обновляется при изменении рецепта, его ингредиентов и тегов, а также
+данных автора, и с отметками пользователя: избранным, списком покупок
+и подпиской на автора. ETag строится из этих данных. При условном
+запросе они читаются лёгким запросом нескольких столбцов до чтения
+и сериализации рецептов, и клиент с актуальным ETag получает 304.
+
+Last-Modified отдаётся только анонимным пользователям на странице
+рецепта: отметки пользователя и состав списка (например, удаление
+рецепта из него) временем изменения рецепта не описываются.
+"""
+import hashlib
+
+from django.utils.http import (http_date, parse_etags, parse_http_date_safe,
+                               quote_etag)
+from rest_framework import status
+from rest_framework.response import Response
+
+from users.models import Follow
+from .membership import get_recipe_ids
+from .models import Favorite, Recipe, ShoppingList
+
+VALIDATOR_COLUMNS = ('id', 'updated_at', 'author_id')
+VALIDATOR_HEADERS = ('ETag', 'Last-Modified')
+
+
+def is_conditional(request):
+    return ('HTTP_IF_NONE_MATCH' in request.META
+            or 'HTTP_IF_MODIFIED_SINCE' in request.META)
+
+
+def get_followed_ids(results):
+    """Авторы с подпиской из уже сериализованных рецептов results."""
+    return {recipe['author']['id'] for recipe in results
+            if recipe['author']['is_subscribed']}
+
+
+def get_user_marks(user, rows, fields, followed_ids=None):
+    """
+    Отметки пользователя у рецептов rows, которые попадут в ответ.
+
+    followed_ids — авторы с подпиской, если они уже известны.
+    """
+    if user.is_anonymous:
+        return ()
+    favorite_ids = cart_ids = ()
+    if 'is_favorited' in fields:
+        favorite_ids = get_recipe_ids(Favorite, user)
+    if 'is_in_shopping_cart' in fields:
+        cart_ids = get_recipe_ids(ShoppingList, user)
+    if 'author' not in fields:
+        followed_ids = ()
+    elif followed_ids is None:
+        followed_ids = set(Follow.objects.filter(
+            user=user, following_id__in={row['author_id'] for row in rows}
+        ).values_list('following_id', flat=True))
+    return [(row['id'] in favorite_ids, row['id'] in cart_ids,
+             row.get('author_id') in followed_ids)
+            for row in rows]
+
+
+def get_validators(request, rows, fields, count=None, detail=False,
+                   followed_ids=None):
+    """
+    Заголовки ETag и Last-Modified ответа с рецептами rows.
+
+    rows — словари со столбцами VALIDATOR_COLUMNS (author_id нужен,
+    только если выбрано поле author), fields — поля ответа, count —
+    количество рецептов в списке с выводом по номеру страницы.
+    Подписки берутся из followed_ids, а если они не переданы, читаются
+    из базы.
+    """
+    digest = hashlib.md5(repr((
+        request.user.pk, request.build_absolute_uri(), count,
+        [(row['id'], row['updated_at'].isoformat()) for row in rows],
+        get_user_marks(request.user, rows, fields, followed_ids),
+    )).encode()).hexdigest()
+    headers = {'ETag': quote_etag(digest)}
+    if detail and request.user.is_anonymous:
+        headers['Last-Modified'] = http_date(
+            rows[0]['updated_at'].timestamp())
+    return headers
+
+
+def not_modified(request, headers):
+    """
+    Ответ 304, если условный запрос совпадает с заголовками headers,
+    иначе None. If-None-Match проверяется раньше If-Modified-Since.
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        etags = parse_etags(if_none_match)
+        matched = '*' in etags or headers.get('ETag') in etags
+    else:
+        since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        modified = parse_http_date_safe(headers.get('Last-Modified', ''))
+        matched = (since is not None and modified is not None
+                   and modified <= since)
+    if not matched:
+        return None
+    return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+def set_validators(response, headers):
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+class ConditionalRecipeMixin:
+    """
+    ETag и Last-Modified для list и retrieve рецептов из строк
+    recipes.fast_serializers с выбором полей recipes.fieldsets.
+
+    В MRO стоит ниже общего кеша ответов, который хранит заголовки
+    вместе с данными. Списки с выводом по курсору без заголовков:
+    ссылка на следующую страницу зависит не только от рецептов страницы.
+    """
+
+    def get_validator_fields(self):
+        return self.get_fieldset() or self.get_fieldset_fields()
+
+    def get_list_validators(self, request, rows, followed_ids=None):
+        return get_validators(
+            request, rows, self.get_validator_fields(),
+            count=self.paginator.page.paginator.count,
+            followed_ids=followed_ids)
+
+    def get_detail_validators(self, request, row, followed_ids=None):
+        return get_validators(
+            request, [row], self.get_validator_fields(), detail=True,
+            followed_ids=followed_ids)
+
+    def get_response_followed_ids(self, request, results):
+        if (request.user.is_anonymous
+                or 'author' not in self.get_validator_fields()):
+            return None
+        return get_followed_ids(results)
+
+    def list(self, request, *args, **kwargs):
+        if self.paginator.is_cursor_mode(request):
+            return super().list(request, *args, **kwargs)
+        if is_conditional(request):
+            rows = self.paginate_queryset(self.filter_queryset(
+                Recipe.objects.values(*VALIDATOR_COLUMNS)))
+            response = not_modified(
+                request, self.get_list_validators(request, rows))
+            if response is not None:
+                return response
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            set_validators(response, self.get_list_validators(
+                request, self.paginator.page.object_list,
+                self.get_response_followed_ids(
+                    request, response.data['results'])))
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        if is_conditional(request) and pk.isdigit():
+            row = self.filter_queryset(
+                Recipe.objects.values(*VALIDATOR_COLUMNS)
+            ).filter(pk=pk).first()
+            if row is not None:
+                response = not_modified(
+                    request, self.get_detail_validators(request, row))
+                if response is not None:
+                    return response
+        response = super().retrieve(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            set_validators(response, self.get_detail_validators(
+                request, self.validator_row,
+                self.get_response_followed_ids(request, [response.data])))
+        return response
+
+    def get_object(self):
+        self.validator_row = super().get_object()
+        return self.validator_row
@@ -0,0 +1,199 @@
+"""
+Быстрые сериализаторы для чтения рецептов.
+
+Вместо моделей с подгруженными связями и DRF-полей на каждый атрибут
+рецепты читаются строками values(), а автор, теги и ингредиенты всей
+страницы добираются тремя запросами values_list и собираются в словари
+обычными функциями. Результат совпадает с RecipeViewSerializer
+до байта после рендеринга.
+
+Если выбраны не все поля (recipes.fieldsets), лишние столбцы
+не читаются, а запросы связей без выбранных полей не выполняются.
+"""
+from collections import defaultdict
+
+from rest_framework import serializers
+
+from users.models import User
+from .images import image_rendition_urls
+from .membership import get_recipe_ids
+from .models import (Favorite, Recipe, RecipeIngredient, RecipeTag,
+                     ShoppingList, is_subscribed)
+from .serializers import RecipeViewSerializer
+
+RECIPE_FIELDS = RecipeViewSerializer.Meta.fields
+# pub_date нужен курсорному постраничному выводу,
+# updated_at — ETag ответа (recipes.conditional).
+ROW_COLUMNS = ('id', 'pub_date', 'updated_at')
+FIELD_COLUMNS = {
+    'author': ('author_id',),
+    'name': ('name',),
+    'image': ('image',),
+    'renditions': ('image', 'renditions_ready'),
+    'text': ('text',),
+    'cooking_time': ('cooking_time',),
+}
+AUTHOR_FIELDS = ('id', 'username', 'first_name', 'last_name', 'email')
+
+image_storage = Recipe._meta.get_field('image').storage
+
+
+def recipe_rows(queryset, fields=RECIPE_FIELDS):
+    """Переводит выборку рецептов в строки для serialize_recipes."""
+    columns = dict.fromkeys(ROW_COLUMNS)
+    for name in fields:
+        columns.update(dict.fromkeys(FIELD_COLUMNS.get(name, ())))
+    return queryset.values(*columns)
+
+
+def get_authors(author_ids, user):
+    rows = User.objects.filter(pk__in=author_ids).annotate(
+        is_subscribed=is_subscribed(user)
+    ).values_list(*AUTHOR_FIELDS, 'is_subscribed')
+    return {
+        row[0]: {
+            'id': row[0],
+            'username': row[1],
+            'first_name': row[2],
+            'last_name': row[3],
+            'email': row[4],
+            'is_subscribed': row[5],
+        }
+        for row in rows
+    }
+
+
+def get_tags(recipe_ids):
+    tags = defaultdict(list)
+    rows = RecipeTag.objects.filter(recipe_id__in=recipe_ids).order_by(
+        'tag_id').values_list(
+        'recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug')
+    for recipe_id, tag_id, name, color, slug in rows:
+        tags[recipe_id].append(
+            {'id': tag_id, 'name': name, 'color': color, 'slug': slug})
+    return tags
+
+
+def get_ingredients(recipe_ids):
+    ingredients = defaultdict(list)
+    rows = RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('id').values_list(
+        'recipe_id', 'ingredient_id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount')
+    for recipe_id, ingredient_id, name, measurement_unit, amount in rows:
+        ingredients[recipe_id].append({
+            'id': ingredient_id,
+            'name': name,
+            'measurement_unit': measurement_unit,
+            'amount': amount,
+        })
+    return ingredients
+
+
+def get_member_ids(model, context):
+    """Множество id из кеша членства, общее для запроса (как в DRF)."""
+    key = f'{model._meta.model_name}_ids'
+    if key not in context:
+        context[key] = get_recipe_ids(model, context['request'].user)
+    return context[key]
+
+
+def get_image_url(image, request):
+    if not image:
+        return None
+    url = image_storage.url(image)
+    return request.build_absolute_uri(url) if request else url
+
+
+def serialize_full(rows, context):
+    """Представления рецептов со всеми полями RecipeViewSerializer."""
+    request = context.get('request')
+    recipe_ids = [row['id'] for row in rows]
+    authors = get_authors({row['author_id'] for row in rows}, request.user)
+    tags = get_tags(recipe_ids)
+    ingredients = get_ingredients(recipe_ids)
+    favorite_ids = get_member_ids(Favorite, context)
+    cart_ids = get_member_ids(ShoppingList, context)
+    return [{
+        'id': row['id'],
+        'tags': tags.get(row['id'], []),
+        'author': authors[row['author_id']],
+        'ingredients': ingredients.get(row['id'], []),
+        'is_favorited': row['id'] in favorite_ids,
+        'is_in_shopping_cart': row['id'] in cart_ids,
+        'name': row['name'],
+        'image': get_image_url(row['image'], request),
+        'renditions': image_rendition_urls(
+            row['image'], row['renditions_ready'], request),
+        'text': row['text'],
+        'cooking_time': row['cooking_time'],
+    } for row in rows]
+
+
+def serialize_fields(rows, context, fields):
+    """Представления рецептов только с полями fields."""
+    request = context.get('request')
+    recipe_ids = [row['id'] for row in rows]
+    related = {}
+    if 'author' in fields:
+        authors = get_authors(
+            {row['author_id'] for row in rows}, request.user)
+        related['author'] = lambda row: authors[row['author_id']]
+    if 'tags' in fields:
+        tags = get_tags(recipe_ids)
+        related['tags'] = lambda row: tags.get(row['id'], [])
+    if 'ingredients' in fields:
+        ingredients = get_ingredients(recipe_ids)
+        related['ingredients'] = lambda row: ingredients.get(row['id'], [])
+    if 'is_favorited' in fields:
+        favorite_ids = get_member_ids(Favorite, context)
+        related['is_favorited'] = lambda row: row['id'] in favorite_ids
+    if 'is_in_shopping_cart' in fields:
+        cart_ids = get_member_ids(ShoppingList, context)
+        related['is_in_shopping_cart'] = lambda row: row['id'] in cart_ids
+    related['image'] = lambda row: get_image_url(row['image'], request)
+    related['renditions'] = lambda row: image_rendition_urls(
+        row['image'], row['renditions_ready'], request)
+
+    getters = [(name, related.get(name)) for name in fields]
+    return [{name: getter(row) if getter else row[name]
+             for name, getter in getters}
+            for row in rows]
+
+
+def serialize_recipes(rows, context, fields=None):
+    """
+    Собирает представления рецептов из строк recipe_rows,
+    оставляя только поля fields, если они заданы.
+    """
+    if not rows:
+        return []
+    if fields is None:
+        return serialize_full(rows, context)
+    return serialize_fields(rows, context, fields)
+
+
+class RecipeRowListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        return serialize_recipes(
+            list(data), self.context, self.child.fieldset)
+
+
+class RecipeRowSerializer(serializers.BaseSerializer):
+    """
+    Сериализатор только для чтения строк recipe_rows.
+
+    Для many=True связи всей страницы читаются общими запросами.
+    """
+
+    class Meta:
+        list_serializer_class = RecipeRowListSerializer
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fieldset = fields
+
+    def to_representation(self, instance):
+        return serialize_recipes(
+            [instance], self.context, self.fieldset)[0]
@@ -0,0 +1,64 @@
+from django.conf import settings
+
+from users.models import Follow
+from .models import FeedEntry, Recipe
+
+BATCH_SIZE = 1000
+
+
+def create_entries(entries):
+    for start in range(0, len(entries), BATCH_SIZE):
+        FeedEntry.objects.bulk_create(
+            entries[start:start + BATCH_SIZE], ignore_conflicts=True)
+
+
+def fan_out(recipe):
+    """
+    Раскладывает новый рецепт по лентам подписчиков автора.
+
+    Рецепты авторов, у которых подписчиков больше
+    FEED_FANOUT_MAX_FOLLOWERS, не раскладываются: читатели забирают
+    их сами при открытии ленты (pull).
+    """
+    user_ids = Follow.objects.filter(
+        following_id=recipe.author_id,
+        following__followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).values_list('user_id', flat=True)
+    create_entries([
+        FeedEntry(user_id=user_id, recipe_id=recipe.pk,
+                  author_id=recipe.author_id, pub_date=recipe.pub_date)
+        for user_id in user_ids])
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные рецепты автора."""
+    recipes = Recipe.objects.filter(
+        author_id=author_id,
+        author__followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).values_list('id', 'pub_date')
+    create_entries([
+        FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                  author_id=author_id, pub_date=pub_date)
+        for recipe_id, pub_date in recipes])
+
+
+def remove(user_id, author_id):
+    """Убирает рецепты автора из ленты отписавшегося пользователя."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def pull(user):
+    """
+    Дописывает в ленту пользователя недостающие рецепты популярных
+    авторов, для которых раскладка при публикации не выполняется.
+    """
+    authors = Follow.objects.filter(
+        user=user,
+        following__followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).values('following_id')
+    recipes = Recipe.objects.filter(author_id__in=authors).exclude(
+        feed_entries__user=user).values_list('id', 'author_id', 'pub_date')
+    create_entries([
+        FeedEntry(user_id=user.pk, recipe_id=recipe_id,
+                  author_id=author_id, pub_date=pub_date)
+        for recipe_id, author_id, pub_date in recipes])
@@ -0,0 +1,78 @@
+"""
+Выбор полей ответа параметрами запроса fields и omit.
+
+fields=name,image оставляет только перечисленные поля верхнего уровня,
+omit=text,ingredients убирает перечисленные. Представления по выбранным
+полям решают, какие связи подгружать и какие столбцы читать.
+"""
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+
+def get_fieldset(query_params, fields):
+    """
+    Возвращает поля из fields, выбранные параметрами запроса, в порядке
+    fields, или None, если выбор полей не запрошен.
+    """
+    selected = {}
+    errors = {}
+    for param in (FIELDS_PARAM, OMIT_PARAM):
+        names = {name.strip()
+                 for name in query_params.get(param, '').split(',')
+                 if name.strip()}
+        unknown = names.difference(fields)
+        if unknown:
+            errors[param] = [
+                f'Неизвестные поля: {", ".join(sorted(unknown))}']
+        if names:
+            selected[param] = names
+    if errors:
+        raise ValidationError(errors)
+    if not selected:
+        return None
+    included = selected.get(FIELDS_PARAM, fields)
+    omitted = selected.get(OMIT_PARAM, ())
+    return tuple(name for name in fields
+                 if name in included and name not in omitted)
+
+
+class SparseFieldsetMixin:
+    """
+    Передаёт сериализатору выбранные поля при чтении в действиях
+    fieldset_actions.
+
+    fieldset_fields — все поля ответа в порядке вывода.
+    """
+    fieldset_fields = ()
+    fieldset_actions = ('list', 'retrieve')
+
+    def get_fieldset_fields(self):
+        return self.fieldset_fields
+
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = None
+            if (self.action in self.fieldset_actions
+                    and self.request.method in SAFE_METHODS):
+                self._fieldset = get_fieldset(
+                    self.request.query_params, self.get_fieldset_fields())
+        return self._fieldset
+
+    def get_serializer(self, *args, **kwargs):
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            kwargs.setdefault('fields', fieldset)
+        return super().get_serializer(*args, **kwargs)
+
+
+class SparseFieldsetSerializerMixin:
+    """Оставляет у сериализатора только поля из аргумента fields."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields).difference(fields):
+                self.fields.pop(name)
@@ -1,41 +1,49 @@
-from django_filters.rest_framework import BooleanFilter, CharFilter, FilterSet
+from django_filters.rest_framework import (BooleanFilter, CharFilter,
+                                           ChoiceFilter, FilterSet)
 
-from .models import Ingredient, Recipe
-
-
-class IngredientFilter(FilterSet):
-    name = CharFilter(field_name='name', lookup_expr='startswith')
-
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+from .membership import get_recipe_ids
+from .models import Favorite, Recipe, ShoppingList
 
 
 class RecipeFilter(FilterSet):
     is_favorited = BooleanFilter()
     is_in_shopping_cart = BooleanFilter()
     tags = CharFilter(field_name='tags__slug')
+    tags_mode = ChoiceFilter(choices=(('any', 'any'), ('all', 'all')))
+    search = CharFilter()
 
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags',)
+        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags',
+                  'tags_mode', 'search')
 
     def filter_queryset(self, queryset):
         author = self.data.get('author')
         if author is not None:
             queryset = queryset.filter(author=author)
 
-        is_favorited = self.data.get('is_favorited')
-        if is_favorited is not None:
-            queryset = queryset.filter(favorite__user=self.request.user)
+        queryset = self.filter_membership(
+            queryset, Favorite, self.form.cleaned_data.get('is_favorited'))
+        queryset = self.filter_membership(
+            queryset, ShoppingList,
+            self.form.cleaned_data.get('is_in_shopping_cart'))
 
-        is_in_shopping_cart = self.data.get('is_in_shopping_cart')
-        if is_in_shopping_cart is not None:
-            queryset = queryset.filter(shopping_cart__user=self.request.user)
+        if self.data.get('tags') is not None:
+            queryset = queryset.with_tags(
+                self.data.getlist('tags'),
+                self.form.cleaned_data.get('tags_mode') == 'all')
 
-        tags = self.data.get('tags')
-        if tags is not None:
-            tags = self.data.getlist('tags')
-            queryset = queryset.filter(tags__slug__in=tags).distinct()
+        search = self.form.cleaned_data.get('search')
+        if search:
+            queryset = queryset.search(search)
 
         return queryset
+
+    def filter_membership(self, queryset, model, value):
+        """Отбирает рецепты по множеству id из кеша членства."""
+        if value is None:
+            return queryset
+        recipe_ids = get_recipe_ids(model, self.request.user)
+        if value:
+            return queryset.filter(id__in=recipe_ids)
+        return queryset.exclude(id__in=recipe_ids)
@@ -0,0 +1,108 @@
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import response_cache
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {
+    'thumbnail': (160, 160),
+    'card': (480, 360),
+}
+FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+QUALITY = 80
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_RENDITION_WORKERS,
+    thread_name_prefix='image-renditions')
+
+
+def rendition_name(image_name, rendition, extension):
+    """Возвращает путь уменьшенной копии рядом с оригиналом."""
+    directory, filename = posixpath.split(image_name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(
+        directory, 'renditions', f'{stem}_{rendition}.{extension}')
+
+
+def rendition_urls(recipe, request=None):
+    """Возвращает ссылки на уменьшенные копии или None, пока их нет."""
+    return image_rendition_urls(
+        recipe.image.name, recipe.renditions_ready, request)
+
+
+def image_rendition_urls(image_name, ready, request=None):
+    """То же по имени файла изображения и флагу готовности копий."""
+    if not image_name or not ready:
+        return None
+    urls = {}
+    for rendition in RENDITIONS:
+        urls[rendition] = {}
+        for extension in FORMATS:
+            url = default_storage.url(
+                rendition_name(image_name, rendition, extension))
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[rendition][extension] = url
+    return urls
+
+
+def generate_renditions(recipe_id, image_name):
+    """
+    Создаёт уменьшенные копии изображения рецепта во всех форматах.
+
+    Готовность копий меняет представление рецепта, поэтому вместе
+    с флагом обновляется updated_at (ETag) и сбрасывается кеш ответов.
+    """
+    try:
+        with default_storage.open(image_name) as file:
+            original = ImageOps.exif_transpose(Image.open(file))
+            original.load()
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA')
+        for rendition, size in RENDITIONS.items():
+            image = ImageOps.fit(original, size, Image.LANCZOS)
+            for extension, image_format in FORMATS.items():
+                output = image
+                if image_format == 'JPEG':
+                    output = image.convert('RGB')
+                buffer = BytesIO()
+                output.save(buffer, image_format, quality=QUALITY)
+                name = rendition_name(image_name, rendition, extension)
+                if default_storage.exists(name):
+                    default_storage.delete(name)
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+        with transaction.atomic():
+            if Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+                    renditions_ready=True, updated_at=timezone.now()):
+                response_cache.invalidate_recipe(recipe_id)
+    except Exception:
+        logger.exception('Не удалось создать копии изображения %s',
+                         image_name)
+    finally:
+        connection.close()
+
+
+def schedule_renditions(recipe):
+    """
+    Ставит создание уменьшенных копий в очередь пула потоков
+    после фиксации транзакции, не задерживая ответ на запрос.
+    """
+    if not recipe.image:
+        return
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: executor.submit(generate_renditions, recipe_id, image_name))
@@ -0,0 +1,143 @@
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from config.db_router import use_primary
+
+from .cache import get_version
+from .models import Ingredient
+
+
+def normalize(value):
+    """Приводит строку к виду для поиска: без регистра, «ё» как «е»."""
+    return ' '.join(value.casefold().replace('ё', 'е').split())
+
+
+def trigrams(value):
+    padded = f'  {value} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class IngredientIndex:
+    """
+    Поисковый индекс ингредиентов в памяти процесса.
+
+    Хранит отсортированные массивы названий и отдельных слов для поиска
+    по префиксу и индекс триграмм для поиска с опечатками. Индекс строится
+    при первом обращении и перестраивается, когда меняется версия
+    ингредиентов в кеше.
+    """
+    exact_rank = 0
+    prefix_rank = 1
+    word_rank = 2
+    fuzzy_rank = 3
+    min_similarity = 0.3
+    version_name = 'ingredients'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._items = []
+        self._by_id = {}
+        self._normalized = []
+        self._names = []
+        self._words = []
+        self._trigrams = {}
+        self._trigram_counts = []
+
+    def build(self):
+        items = list(Ingredient.objects.order_by('name').values(
+            'id', 'name', 'measurement_unit'))
+        normalized = []
+        names = []
+        words = []
+        trigram_index = defaultdict(list)
+        trigram_counts = []
+        for position, item in enumerate(items):
+            name = normalize(item['name'])
+            normalized.append(name)
+            names.append((name, position))
+            for word in name.split()[1:]:
+                words.append((word, position))
+            name_trigrams = trigrams(name)
+            trigram_counts.append(len(name_trigrams))
+            for trigram in name_trigrams:
+                trigram_index[trigram].append(position)
+        names.sort()
+        words.sort()
+
+        self._items = items
+        self._by_id = {item['id']: item for item in items}
+        self._normalized = normalized
+        self._names = names
+        self._words = words
+        self._trigrams = dict(trigram_index)
+        self._trigram_counts = trigram_counts
+
+    def ensure_fresh(self):
+        version = get_version(self.version_name)
+        if self._version == version:
+            return
+        with self._lock, use_primary():
+            if self._version != version:
+                self.build()
+                self._version = version
+
+    def get_many(self, ingredient_ids):
+        """Возвращает ингредиенты по списку id, пропуская отсутствующие."""
+        self.ensure_fresh()
+        return [self._by_id[pk] for pk in ingredient_ids if pk in self._by_id]
+
+    def all(self, limit=None):
+        self.ensure_fresh()
+        return self._items[:limit]
+
+    def search(self, query, limit=None):
+        """
+        Возвращает ингредиенты, подходящие под запрос, по убыванию
+        релевантности: точное совпадение, начало названия, начало слова
+        внутри названия, похожие по триграммам названия.
+        """
+        self.ensure_fresh()
+        query = normalize(query)
+        if not query:
+            return self.all(limit)
+
+        ranks = {}
+        for position in self._prefix_matches(self._names, query):
+            exact = self._normalized[position] == query
+            ranks[position] = (
+                self.exact_rank if exact else self.prefix_rank, 0)
+        for position in self._prefix_matches(self._words, query):
+            ranks.setdefault(position, (self.word_rank, 0))
+        if limit is None or len(ranks) < limit:
+            for position, similarity in self._fuzzy_matches(query):
+                ranks.setdefault(position, (self.fuzzy_rank, -similarity))
+
+        positions = sorted(ranks, key=lambda position: (
+            ranks[position],
+            len(self._items[position]['name']),
+            position))
+        return [self._items[position] for position in positions[:limit]]
+
+    @staticmethod
+    def _prefix_matches(keys, query):
+        for index in range(bisect_left(keys, (query,)), len(keys)):
+            key, position = keys[index]
+            if not key.startswith(query):
+                break
+            yield position
+
+    def _fuzzy_matches(self, query):
+        query_trigrams = trigrams(query)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self._trigrams.get(trigram, ()))
+        for position, common in shared.items():
+            similarity = common / (
+                len(query_trigrams) + self._trigram_counts[position] - common)
+            if similarity >= self.min_similarity:
+                yield position, similarity
+
+
+ingredient_index = IngredientIndex()
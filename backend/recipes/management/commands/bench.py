@@ -0,0 +1,299 @@
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from recipes.fast_serializers import RecipeRowSerializer, recipe_rows
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.renderers import ORJSONRenderer
+from recipes.serializers import RecipeViewSerializer
+from users.models import User
+
+SERIALIZER_PAGE_SIZE = 100
+SERIALIZER_PAGES = 5
+
+
+def get_host():
+    host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else ''
+    return host.lstrip('.') if host not in ('', '*') else 'localhost'
+
+
+def render_model_page(request, offset):
+    """Страница рецептов через RecipeViewSerializer и JSONRenderer."""
+    recipes = Recipe.objects.for_view(request.user).order_by(
+        '-pub_date', '-id')[offset:offset + SERIALIZER_PAGE_SIZE]
+    return JSONRenderer().render(RecipeViewSerializer(
+        recipes, many=True, context={'request': request}).data)
+
+
+def render_row_page(request, offset):
+    """Та же страница через быстрые сериализаторы и ORJSONRenderer."""
+    rows = recipe_rows(Recipe.objects.order_by('-pub_date', '-id'))[
+        offset:offset + SERIALIZER_PAGE_SIZE]
+    return ORJSONRenderer().render(RecipeRowSerializer(
+        rows, many=True, context={'request': request}).data)
+
+
+class Bench:
+    """
+    Сценарии замеров. Каждый метод выполняет один запрос к API
+    и возвращает ответ; параметры выбираются генератором rng.
+    """
+
+    def __init__(self, user, rng):
+        self.user = user
+        self.rng = rng
+        host = get_host()
+        token, _ = Token.objects.get_or_create(user=user)
+        self.client = Client(
+            HTTP_HOST=host, HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.anonymous = Client(HTTP_HOST=host)
+
+        recipe_ids = list(Recipe.objects.order_by('id').values_list(
+            'id', flat=True))
+        self.recipe_ids = rng.sample(recipe_ids, min(1000, len(recipe_ids)))
+        self.tags = list(Tag.objects.order_by('id').values_list(
+            'slug', flat=True))
+        self.ingredients = list(Ingredient.objects.order_by('id').values_list(
+            'id', 'name')[:1000])
+        self.authors = list(User.objects.filter(
+            recipes_count__gt=0).order_by('id').values_list(
+            'id', flat=True)[:1000])
+        self.own_recipe = Recipe.objects.filter(author=user).first()
+
+    def page(self):
+        return self.rng.randint(1, 20)
+
+    def recipe_list(self):
+        return self.client.get(f'/api/recipes/?page={self.page()}')
+
+    def recipe_list_100(self):
+        return self.client.get(
+            f'/api/recipes/?limit=100&page={self.page()}')
+
+    def recipe_list_compact(self):
+        return self.client.get(
+            f'/api/recipes/?limit=100&page={self.page()}'
+            '&fields=id,name,image,cooking_time,tags')
+
+    def recipe_list_anonymous(self):
+        return self.anonymous.get(f'/api/recipes/?page={self.page()}')
+
+    def recipe_list_cursor(self):
+        return self.client.get('/api/recipes/?pagination=cursor')
+
+    def recipe_detail(self):
+        recipe_id = self.rng.choice(self.recipe_ids)
+        return self.client.get(f'/api/recipes/{recipe_id}/')
+
+    def recipe_list_tags(self):
+        tags = '&'.join(f'tags={slug}'
+                        for slug in self.rng.sample(self.tags, 2))
+        return self.client.get(f'/api/recipes/?{tags}&page={self.page()}')
+
+    def recipe_list_tags_all(self):
+        tags = '&'.join(f'tags={slug}'
+                        for slug in self.rng.sample(self.tags, 2))
+        return self.client.get(f'/api/recipes/?{tags}&tags_mode=all')
+
+    def recipe_list_author(self):
+        author = self.rng.choice(self.authors)
+        return self.client.get(f'/api/recipes/?author={author}')
+
+    def recipe_list_favorited(self):
+        return self.client.get('/api/recipes/?is_favorited=1')
+
+    def recipe_list_in_cart(self):
+        return self.client.get('/api/recipes/?is_in_shopping_cart=1')
+
+    def recipe_search(self):
+        _, name = self.rng.choice(self.ingredients)
+        return self.client.get('/api/recipes/', {'search': name})
+
+    def recipe_feed(self):
+        return self.client.get('/api/recipes/feed/')
+
+    def recipe_by_ingredients(self):
+        have = ','.join(str(pk) for pk, _ in self.rng.sample(
+            self.ingredients, min(5, len(self.ingredients))))
+        return self.client.get(f'/api/recipes/by_ingredients/?have={have}')
+
+    def subscriptions(self):
+        return self.client.get('/api/users/subscriptions/?recipes_limit=3')
+
+    def shopping_cart_download(self):
+        return self.client.get('/api/recipes/download_shopping_cart/')
+
+    def shopping_cart_summary(self):
+        return self.client.get('/api/recipes/shopping_cart_summary/')
+
+    def ingredient_search(self):
+        _, name = self.rng.choice(self.ingredients)
+        return self.client.get('/api/ingredients/', {'name': name[:3]})
+
+    def recipe_payload(self):
+        return {
+            'name': 'Замер',
+            'text': 'Рецепт для замера времени ответа.',
+            'cooking_time': self.rng.randint(1, 120),
+            'tags': list(Tag.objects.values_list('id', flat=True)[:2]),
+            'ingredients': [
+                {'id': pk, 'amount': self.rng.randint(1, 500)}
+                for pk, _ in self.rng.sample(
+                    self.ingredients, min(6, len(self.ingredients)))],
+        }
+
+    def recipe_create(self):
+        return self.client.post('/api/recipes/', self.recipe_payload(),
+                                content_type='application/json')
+
+    def recipe_update(self):
+        return self.client.patch(f'/api/recipes/{self.own_recipe.id}/',
+                                 self.recipe_payload(),
+                                 content_type='application/json')
+
+
+SCENARIOS = (
+    'recipe_list', 'recipe_list_100', 'recipe_list_compact',
+    'recipe_list_anonymous', 'recipe_list_cursor', 'recipe_detail',
+    'recipe_list_tags', 'recipe_list_tags_all', 'recipe_list_author',
+    'recipe_list_favorited', 'recipe_list_in_cart', 'recipe_search',
+    'recipe_feed', 'recipe_by_ingredients', 'subscriptions',
+    'shopping_cart_download', 'shopping_cart_summary', 'ingredient_search',
+    'recipe_create', 'recipe_update',
+)
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время ответа и число SQL-запросов основных '
+            'эндпоинтов на данных seed_bench. Изменения, сделанные '
+            'во время замеров, откатываются')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help='Количество замеряемых запросов на сценарий')
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Количество запросов прогрева перед замером')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--scenario', action='append', choices=SCENARIOS,
+            help='Запустить только указанные сценарии')
+        parser.add_argument(
+            '--serializers', action='store_true',
+            help='Сверить вывод быстрых сериализаторов с '
+                 'RecipeViewSerializer и сравнить время CPU на страницах '
+                 f'по {SERIALIZER_PAGE_SIZE} рецептов')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(recipes_count__gt=0).order_by(
+            '-recipes_count', 'id').first()
+        if user is None:
+            raise CommandError(
+                'Нет данных для замеров, сначала выполните seed_bench')
+        if options['repeat'] < 2:
+            raise CommandError('--repeat должен быть не меньше 2')
+
+        if options['serializers']:
+            return self.compare_serializers(
+                user, random.Random(options['seed']), options['repeat'])
+
+        rows = []
+        with transaction.atomic():
+            bench = Bench(user, random.Random(options['seed']))
+            for name in options['scenario'] or SCENARIOS:
+                rows.append(self.measure(
+                    name, getattr(bench, name),
+                    options['warmup'], options['repeat']))
+            transaction.set_rollback(True)
+        self.report(rows)
+
+    def request(self, name, scenario):
+        response = scenario()
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{name}: ответ {response.status_code} '
+                f'{response.content[:200]!r}')
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+
+    def measure(self, name, scenario, warmup, repeat):
+        for _ in range(warmup):
+            self.request(name, scenario)
+        latencies, queries = [], []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                self.request(name, scenario)
+                latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(len(context.captured_queries))
+        percentiles = statistics.quantiles(
+            latencies, n=100, method='inclusive')
+        return (name, percentiles[49], percentiles[89], percentiles[98],
+                max(latencies), statistics.median(queries), max(queries))
+
+    def compare_serializers(self, user, rng, repeat):
+        """
+        Проверяет, что быстрые сериализаторы с ORJSONRenderer выдают
+        те же байты, что RecipeViewSerializer с JSONRenderer, и замеряет
+        процессорное время построения страницы обоими способами.
+        """
+        factory = RequestFactory(HTTP_HOST=get_host())
+        count = Recipe.objects.count()
+        offsets = [rng.randrange(max(1, count - SERIALIZER_PAGE_SIZE))
+                   for _ in range(SERIALIZER_PAGES)]
+        rows = []
+        for label, page_user in (('анонимный', AnonymousUser()),
+                                 ('авторизованный', user)):
+            request = Request(factory.get('/api/recipes/'))
+            request.user = page_user
+            for offset in offsets:
+                if (render_model_page(request, offset)
+                        != render_row_page(request, offset)):
+                    raise CommandError(
+                        f'Вывод отличается: {label}, смещение {offset}')
+            for name, render in (('RecipeViewSerializer', render_model_page),
+                                 ('быстрые', render_row_page)):
+                timings = []
+                for number in range(repeat):
+                    start = time.process_time()
+                    render(request, offsets[number % len(offsets)])
+                    timings.append((time.process_time() - start) * 1000)
+                rows.append((f'{label}, {name}', timings))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Вывод совпадает на {len(offsets)} страницах для обоих '
+            'пользователей'))
+        width = max(len(name) for name, _ in rows)
+        self.stdout.write(f'{"CPU, мс":<{width}} {"p50":>8} {"p90":>8}')
+        for name, timings in rows:
+            percentiles = statistics.quantiles(
+                timings, n=10, method='inclusive')
+            self.stdout.write(f'{name:<{width}} {percentiles[4]:>8.1f} '
+                              f'{percentiles[8]:>8.1f}')
+        for model_row, fast_row in zip(rows[::2], rows[1::2]):
+            speedup = (statistics.median(model_row[1])
+                       / statistics.median(fast_row[1]))
+            self.stdout.write(
+                f'{fast_row[0]}: в {speedup:.1f} раза быстрее')
+
+    def report(self, rows):
+        header = ('сценарий', 'p50 мс', 'p90 мс', 'p99 мс', 'max мс',
+                  'SQL med', 'SQL max')
+        width = max(len(row[0]) for row in rows)
+        self.stdout.write(f'{header[0]:<{width}} ' + ' '.join(
+            f'{title:>8}' for title in header[1:]))
+        for name, *values in rows:
+            self.stdout.write(f'{name:<{width}} ' + ' '.join(
+                f'{value:>8.1f}' for value in values))
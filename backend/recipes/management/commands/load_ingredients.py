@@ -0,0 +1,129 @@
+import csv
+import json
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.cache import bump_version
+from recipes.models import Ingredient
+
+DEFAULT_PATH = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+READ_SIZE = 64 * 1024
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if len(row) < 2 or row[:2] == ['name', 'measurement_unit']:
+            continue
+        yield row[0], row[1]
+
+
+def iter_json(file):
+    """
+    Читает JSON-массив объектов или JSON Lines по частям,
+    не загружая файл в память целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n[,]':
+            position += 1
+        if position == len(buffer):
+            if eof:
+                return
+            buffer, position = file.read(READ_SIZE), 0
+            eof = not buffer
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise CommandError(f'Некорректный JSON в позиции {position}')
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        position = end
+        yield item.get('name', ''), item.get('measurement_unit', '')
+
+
+READERS = {
+    '.csv': iter_csv,
+    '.json': iter_json,
+    '.jsonl': iter_json,
+}
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из csv или json файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=str(DEFAULT_PATH),
+            help='Путь к файлу ингредиентов (.csv, .json или .jsonl)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Количество строк, записываемых за один запрос')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError(f'Неподдерживаемый формат файла: {path}')
+        if not path.exists():
+            raise CommandError(f'Файл не найден: {path}')
+
+        name_length = Ingredient._meta.get_field('name').max_length
+        unit_length = Ingredient._meta.get_field(
+            'measurement_unit').max_length
+        inserted = skipped = invalid = 0
+        with path.open(encoding='utf-8') as file:
+            rows = reader(file)
+            while True:
+                batch = list(islice(rows, options['chunk_size']))
+                if not batch:
+                    break
+                chunk = {}
+                for name, unit in batch:
+                    name, unit = name.strip(), unit.strip()
+                    if (not name or not unit or len(name) > name_length
+                            or len(unit) > unit_length):
+                        invalid += 1
+                    elif (name, unit) in chunk:
+                        skipped += 1
+                    else:
+                        chunk[(name, unit)] = Ingredient(
+                            name=name, measurement_unit=unit)
+                if not chunk:
+                    continue
+                created, existing = self.upsert(chunk)
+                inserted += created
+                skipped += existing
+
+        if inserted:
+            bump_version('ingredients')
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {inserted}, пропущено: {skipped}, '
+            f'с ошибками: {invalid}'))
+
+    @staticmethod
+    def upsert(chunk):
+        """
+        Записывает новые ингредиенты одним запросом.
+
+        Уже существующие пары (name, measurement_unit) отбрасываются
+        заранее, а конфликты от параллельной загрузки гасит
+        ограничение unique_ingredient.
+        """
+        with transaction.atomic():
+            existing = set(Ingredient.objects.filter(
+                name__in={name for name, _ in chunk}
+            ).values_list('name', 'measurement_unit'))
+            new = [ingredient for key, ingredient in chunk.items()
+                   if key not in existing]
+            Ingredient.objects.bulk_create(new, ignore_conflicts=True)
+        return len(new), len(chunk) - len(new)
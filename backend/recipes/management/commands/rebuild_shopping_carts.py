@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from recipes import shopping_cart
+
+
+class Command(BaseCommand):
+    help = ('Собирает сводки списков покупок пользователей, для которых '
+            'они ещё не собраны')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересобрать сводки всех пользователей')
+
+    def handle(self, *args, **options):
+        built = shopping_cart.build_missing(rebuild=options['all'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Собрано сводок списков покупок: {built}'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe
+from users.models import Follow, User
+
+
+def count_subquery(queryset, field):
+    """Подзапрос с количеством строк queryset для внешней записи."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики избранного, подписчиков и рецептов, '
+            'исправляя расхождения с данными')
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.update(
+            favorites_count=count_subquery(Favorite.objects, 'recipe'))
+        users = User.objects.update(
+            followers_count=count_subquery(Follow.objects, 'following'),
+            recipes_count=count_subquery(Recipe.objects, 'author'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, пользователей: {users}'))
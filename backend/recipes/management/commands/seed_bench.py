@@ -0,0 +1,210 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingList, Tag)
+from users.models import Follow, User
+
+USERNAME_PREFIX = 'bench'
+PASSWORD = 'bench-password'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast', 5),
+    ('Обед', '#49B64E', 'lunch', 5),
+    ('Ужин', '#8775D2', 'dinner', 5),
+    ('Десерт', '#F2C94C', 'dessert', 2),
+    ('Выпечка', '#B5651D', 'baking', 2),
+    ('Салат', '#6FCF97', 'salad', 2),
+    ('Суп', '#EB5757', 'soup', 2),
+    ('Напиток', '#2D9CDB', 'drinks', 1),
+)
+DISHES = ('Суп', 'Салат', 'Пирог', 'Каша', 'Омлет', 'Паста', 'Рагу',
+          'Запеканка', 'Блины', 'Котлеты', 'Плов', 'Смузи')
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Сергей')
+LAST_NAMES = ('Иванова', 'Петров', 'Смирнова', 'Кузнецов', 'Попова')
+
+
+def zipf_cum_weights(size, exponent):
+    """Накопленные веса распределения Ципфа для random.choices."""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, size + 1)))
+
+
+class Command(BaseCommand):
+    help = ('Создаёт воспроизводимый набор данных для нагрузочных '
+            'замеров: пользователей, рецепты, подписки, избранное '
+            'и списки покупок')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20000)
+        parser.add_argument('--recipes', type=int, default=200000)
+        parser.add_argument(
+            '--ingredients', type=int, default=2000,
+            help='Сколько ингредиентов создать, если их меньше в базе')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Количество строк, записываемых за один запрос')
+        parser.add_argument(
+            '--flush', action='store_true',
+            help='Предварительно очистить всю базу командой flush')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        if options['flush']:
+            call_command('flush', interactive=False)
+        elif User.objects.exists() or Recipe.objects.exists():
+            raise CommandError(
+                'Набор создаётся в пустой базе, запустите команду '
+                'с --flush или очистите базу самостоятельно')
+
+        with transaction.atomic():
+            tags = self.create_tags()
+            ingredients = self.create_ingredients(options['ingredients'])
+            users = self.create_users(options['users'])
+            authors = self.rng.sample(users, max(1, len(users) // 4))
+            recipes = self.create_recipes(
+                options['recipes'], authors, tags, ingredients)
+            self.create_follows(users, authors)
+            self.create_memberships(users, recipes)
+
+        for command in ('recount', 'update_search_vectors', 'rebuild_feed',
+                        'rebuild_shopping_carts'):
+            call_command(command, stdout=self.stdout)
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(users)}, рецептов: {len(recipes)}'))
+
+    def bulk_create(self, model, objects):
+        for start in range(0, len(objects), self.chunk_size):
+            model.objects.bulk_create(
+                objects[start:start + self.chunk_size])
+
+    def create_tags(self):
+        existing = set(Tag.objects.values_list('slug', flat=True))
+        self.bulk_create(Tag, [
+            Tag(name=name, color=color, slug=slug)
+            for name, color, slug, _ in TAGS if slug not in existing])
+        tag_ids = dict(Tag.objects.filter(
+            slug__in=[slug for _, _, slug, _ in TAGS]
+        ).values_list('slug', 'id'))
+        return ([tag_ids[slug] for _, _, slug, _ in TAGS],
+                list(accumulate(weight for *_, weight in TAGS)))
+
+    def create_ingredients(self, count):
+        existing = Ingredient.objects.count()
+        self.bulk_create(Ingredient, [
+            Ingredient(name=f'Ингредиент {number}',
+                       measurement_unit=self.rng.choice(UNITS))
+            for number in range(existing, count)])
+        return list(Ingredient.objects.order_by('id').values_list(
+            'id', 'name'))
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)
+        now = timezone.now()
+        self.bulk_create(User, [
+            User(username=f'{USERNAME_PREFIX}{number}',
+                 email=f'{USERNAME_PREFIX}{number}@example.com',
+                 first_name=self.rng.choice(FIRST_NAMES),
+                 last_name=self.rng.choice(LAST_NAMES),
+                 password=password,
+                 date_joined=now - timedelta(minutes=count - number))
+            for number in range(count)])
+        return list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_recipes(self, count, authors, tags, ingredients):
+        """
+        Создаёт рецепты порциями. Число рецептов у авторов и частота
+        ингредиентов распределены по Ципфу, у рецепта 1-3 тега
+        и 3-12 ингредиентов.
+        """
+        rng = self.rng
+        author_weights = zipf_cum_weights(len(authors), 0.7)
+        ingredient_order = rng.sample(ingredients, len(ingredients))
+        ingredient_weights = zipf_cum_weights(len(ingredients), 1.0)
+        tag_ids, tag_weights = tags
+        recipe_ids = []
+        for start in range(0, count, self.chunk_size):
+            size = min(self.chunk_size, count - start)
+            chunk_authors = rng.choices(
+                authors, cum_weights=author_weights, k=size)
+            chunk = []
+            for offset, author_id in enumerate(chunk_authors):
+                number = start + offset
+                recipe_ingredients = set()
+                target = rng.randint(3, min(12, len(ingredients)))
+                while len(recipe_ingredients) < target:
+                    recipe_ingredients.add(rng.choices(
+                        ingredient_order, cum_weights=ingredient_weights)[0])
+                recipe_tags = set(rng.choices(
+                    tag_ids, cum_weights=tag_weights,
+                    k=1 + (rng.random() < 0.4) + (rng.random() < 0.1)))
+                names = sorted(name for _, name in recipe_ingredients)
+                chunk.append((
+                    Recipe(author_id=author_id,
+                           name=(f'{rng.choice(DISHES)} «{names[0]}» '
+                                 f'№{number}'),
+                           text=f'Смешайте {", ".join(names)} и подавайте.',
+                           cooking_time=rng.randint(5, 180)),
+                    recipe_tags, recipe_ingredients))
+
+            self.bulk_create(Recipe, [recipe for recipe, _, _ in chunk])
+            ids = list(Recipe.objects.order_by('-id').values_list(
+                'id', flat=True)[:size])[::-1]
+            self.bulk_create(RecipeTag, [
+                RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id, (_, recipe_tags, _) in zip(ids, chunk)
+                for tag_id in recipe_tags])
+            self.bulk_create(RecipeIngredient, [
+                RecipeIngredient(recipe_id=recipe_id,
+                                 ingredient_id=ingredient_id,
+                                 amount=rng.randint(1, 500))
+                for recipe_id, (_, _, recipe_ingredients) in zip(ids, chunk)
+                for ingredient_id, _ in sorted(recipe_ingredients)])
+            recipe_ids.extend(ids)
+            self.stdout.write(f'Рецептов: {len(recipe_ids)} из {count}')
+        return recipe_ids
+
+    def pick(self, population, cum_weights, mean, exclude=None):
+        """Выбирает около mean различных элементов с весами cum_weights."""
+        count = min(int(self.rng.expovariate(1 / mean)), len(population) - 1)
+        picked = set()
+        for _ in range(count * 2):
+            if len(picked) >= count:
+                break
+            item = self.rng.choices(population, cum_weights=cum_weights)[0]
+            if item != exclude:
+                picked.add(item)
+        return sorted(picked)
+
+    def create_follows(self, users, authors):
+        order = self.rng.sample(authors, len(authors))
+        weights = zipf_cum_weights(len(order), 1.0)
+        self.bulk_create(Follow, [
+            Follow(user_id=user_id, following_id=author_id)
+            for user_id in users
+            for author_id in self.pick(order, weights, 5, exclude=user_id)])
+
+    def create_memberships(self, users, recipes):
+        order = self.rng.sample(recipes, len(recipes))
+        weights = zipf_cum_weights(len(order), 0.8)
+        self.bulk_create(Favorite, [
+            Favorite(user_id=user_id, recipe_id=recipe_id)
+            for user_id in users
+            for recipe_id in self.pick(order, weights, 10)])
+        self.bulk_create(ShoppingList, [
+            ShoppingList(user_id=user_id, recipe_id=recipe_id)
+            for user_id in users if self.rng.random() < 0.3
+            for recipe_id in self.pick(order, weights, 4)])
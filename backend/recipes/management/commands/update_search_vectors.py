@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает поисковые векторы всех рецептов'
+
+    def handle(self, *args, **options):
+        updated = Recipe.objects.update_search_vector()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено рецептов: {updated}'))
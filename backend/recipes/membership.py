@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from users.models import User
+
+MEMBERSHIP_KEY = 'membership:{}:{}'
+
+
+def get_key(model, user_id):
+    return MEMBERSHIP_KEY.format(model._meta.model_name, user_id)
+
+
+def get_recipe_ids(model, user):
+    """
+    Возвращает множество id рецептов пользователя в избранном
+    или списке покупок (model), загружая его в кеш при промахе.
+    """
+    if user.is_anonymous:
+        return frozenset()
+    key = get_key(model, user.id)
+    recipe_ids = cache.get(key)
+    if recipe_ids is None:
+        recipe_ids = set(model.objects.filter(user=user).values_list(
+            'recipe_id', flat=True))
+        cache.set(key, recipe_ids, settings.MEMBERSHIP_CACHE_TIMEOUT)
+    return recipe_ids
+
+
+def invalidate_recipe_ids(model, user_id):
+    """
+    Удаляет закешированное множество после фиксации транзакции.
+
+    Множество не правится на месте: одновременные изменения потеряли бы
+    друг друга. Оно будет загружено из базы при следующем чтении.
+    """
+    transaction.on_commit(lambda: cache.delete(get_key(model, user_id)))
+
+
+def lock_user(user_id):
+    """
+    Блокирует строку пользователя до конца транзакции, чтобы изменения
+    его избранного и списка покупок шли по очереди: членство,
+    прочитанное перед записью, остаётся верным до её конца.
+    """
+    User.objects.select_for_update().filter(pk=user_id).exists()
@@ -0,0 +1,91 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+TABLE = 'recipes_recipe_tags'
+AUTO_UNIQUE = 'recipes_recipe_tags_recipe_id_tag_id_uniq'
+
+
+def unique_constraints(schema_editor):
+    """Уникальные ограничения (recipe_id, tag_id) таблицы тегов рецептов."""
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, TABLE)
+    return [name for name, info in constraints.items()
+            if info['unique'] and not info['primary_key']
+            and info['columns'] == ['recipe_id', 'tag_id']]
+
+
+def drop_auto_unique(apps, schema_editor):
+    """
+    Удаляет ограничение уникальности, которое Django создал для
+    автоматической промежуточной таблицы: его заменяет unique_recipe_tag.
+    В SQLite ограничение входит в CREATE TABLE и остаётся.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    quote = schema_editor.quote_name
+    for name in unique_constraints(schema_editor):
+        if name != 'unique_recipe_tag':
+            schema_editor.execute(
+                f'ALTER TABLE {quote(TABLE)} DROP CONSTRAINT {quote(name)}')
+
+
+def restore_auto_unique(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    if len(unique_constraints(schema_editor)) > 1:
+        return
+    quote = schema_editor.quote_name
+    schema_editor.execute(
+        f'ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(AUTO_UNIQUE)} '
+        f'UNIQUE ({quote("recipe_id")}, {quote("tag_id")})')
+
+
+class Migration(migrations.Migration):
+    """
+    Переводит Recipe.tags на промежуточную модель RecipeTag.
+
+    Таблица recipes_recipe_tags уже есть: её создал Django для
+    ManyToManyField без through, и AlterField не умеет заменить такое
+    поле полем с through. Поэтому модель и поле меняются только
+    в состоянии миграций, а в базе добавляются именованное ограничение
+    уникальности и индекс (tag, recipe) для отбора рецептов по тегу.
+    """
+
+    dependencies = [
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='RecipeTag',
+                    fields=[
+                        ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_tags', to='recipes.Recipe')),
+                        ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_tags', to='recipes.Tag')),
+                    ],
+                    options={
+                        'verbose_name': 'Тег рецепта',
+                        'verbose_name_plural': 'Теги рецептов',
+                        'db_table': TABLE,
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='recipe',
+                    name='tags',
+                    field=models.ManyToManyField(related_name='recipes', through='recipes.RecipeTag', to='recipes.Tag', verbose_name='Тег'),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='recipetag',
+            constraint=models.UniqueConstraint(fields=('recipe', 'tag'), name='unique_recipe_tag'),
+        ),
+        migrations.RunPython(drop_auto_unique, restore_auto_unique),
+        migrations.AddIndex(
+            model_name='recipetag',
+            index=models.Index(fields=['tag', 'recipe'], name='recipe_tag_tag_recipe_idx'),
+        ),
+    ]
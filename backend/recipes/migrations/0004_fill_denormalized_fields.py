@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import (Count, IntegerField, OuterRef, Subquery,
+                              TextField)
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def count_subquery(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    """Счётчики, как их считает команда recount."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    User = apps.get_model('users', 'User')
+    Follow = apps.get_model('users', 'Follow')
+    Recipe.objects.update(
+        favorites_count=count_subquery(Favorite.objects, 'recipe'))
+    User.objects.update(
+        followers_count=count_subquery(Follow.objects, 'following'),
+        recipes_count=count_subquery(Recipe.objects, 'author'))
+
+
+def fill_search_vectors(apps, schema_editor):
+    """Поисковые векторы, как их считает Recipe.update_search_vector."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from django.contrib.postgres.aggregates import StringAgg
+    from django.contrib.postgres.search import SearchVector
+
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    config = settings.SEARCH_CONFIG
+    ingredients = RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk')
+    ).order_by().values('recipe').annotate(
+        names=StringAgg('ingredient__name', ' ')
+    ).values('names')
+    Recipe.objects.update(search_vector=(
+        SearchVector('name', weight='A', config=config)
+        + SearchVector(Subquery(ingredients, output_field=TextField()),
+                       weight='B', config=config)
+        + SearchVector('text', weight='C', config=config)))
+
+
+def fill_feeds(apps, schema_editor):
+    """Ленты подписок, как их раскладывает recipes.feed.backfill."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    Follow = apps.get_model('users', 'Follow')
+    follows = Follow.objects.filter(
+        following__followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).values_list('user_id', 'following_id')
+    entries = []
+    for user_id, author_id in follows.iterator():
+        entries.extend(
+            FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                      author_id=author_id, pub_date=pub_date)
+            for recipe_id, pub_date in Recipe.objects.filter(
+                author_id=author_id).values_list('id', 'pub_date'))
+        if len(entries) >= BATCH_SIZE:
+            FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+            entries = []
+    FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    """
+    Заполняет для уже существующих данных столбцы и таблицы
+    из 0003: счётчики, поисковые векторы и ленты подписок.
+    Сводки списков покупок собирает команда rebuild_shopping_carts.
+    """
+
+    dependencies = [
+        ('recipes', '0003_recipe_denormalized_fields'),
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
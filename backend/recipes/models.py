@@ -1,9 +1,16 @@
 from colorfield.fields import ColorField
 
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, SearchVectorField)
 from django.core.validators import MinValueValidator, MinLengthValidator
-from django.db import models
+from django.db import connections, models, router
+from django.db.models import (BooleanField, Count, Exists, F, OuterRef,
+                              Prefetch, Q, Subquery, TextField, Value)
+from django.utils import timezone
 
-from users.models import User
+from users.models import Follow, User
 
 
 class Ingredient(models.Model):
@@ -58,6 +65,139 @@ class Tag(models.Model):
         return self.name
 
 
+class SearchVectorIndex(GinIndex):
+    """GIN-индекс, который вне PostgreSQL создаётся обычным индексом."""
+
+    def create_sql(self, model, schema_editor, using=''):
+        if schema_editor.connection.vendor != 'postgresql':
+            return models.Index.create_sql(self, model, schema_editor, using)
+        return super().create_sql(model, schema_editor, using)
+
+
+def is_subscribed(user):
+    """Выражение «user подписан на этого автора» для выборки авторов."""
+    if user.is_authenticated:
+        return Exists(Follow.objects.filter(
+            user=user, following=OuterRef('pk')))
+    return Value(False, output_field=BooleanField())
+
+
+def delete_without_signals(queryset):
+    """
+    Удаляет строки queryset одним DELETE в основной базе, без сигналов
+    pre_delete и post_delete и без каскада. Только для таблиц, на которые
+    никто не ссылается; зависимые данные обновляет вызывающий код.
+
+    Возвращает количество удалённых строк.
+    """
+    model = queryset.model
+    db = router.db_for_write(model)
+    connection = connections[db]
+    qn = connection.ops.quote_name
+    sql, params = queryset.using(db).values('pk').query.get_compiler(
+        db).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {qn(model._meta.db_table)} '
+            f'WHERE {qn(model._meta.pk.column)} IN ({sql})', params)
+        return cursor.rowcount
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов рецептов."""
+
+    @property
+    def is_postgresql(self):
+        return connections[self.db].vendor == 'postgresql'
+
+    def touch(self):
+        """Отмечает рецепты изменёнными: обновляет updated_at."""
+        return self.update(updated_at=timezone.now())
+
+    def update_search_vector(self):
+        """
+        Пересчитывает поисковый вектор: название с весом A,
+        названия ингредиентов с весом B и описание с весом C.
+        """
+        if not self.is_postgresql:
+            return 0
+        from django.contrib.postgres.aggregates import StringAgg
+
+        config = settings.SEARCH_CONFIG
+        ingredients = RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=config)
+            + SearchVector(Subquery(ingredients, output_field=TextField()),
+                           weight='B', config=config)
+            + SearchVector('text', weight='C', config=config)))
+
+    def search(self, text):
+        """
+        Ищет рецепты по названию, ингредиентам и описанию.
+
+        В PostgreSQL используется поисковый вектор с GIN-индексом
+        и сортировка по SearchRank, в остальных базах поиск по вхождению.
+        """
+        if not self.is_postgresql:
+            return self.filter(
+                Q(name__icontains=text)
+                | Q(text__icontains=text)
+                | Q(id__in=RecipeIngredient.objects.filter(
+                    ingredient__name__icontains=text).values('recipe')))
+        query = SearchQuery(text, config=settings.SEARCH_CONFIG)
+        return self.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-pub_date')
+
+    def with_tags(self, slugs, match_all=False):
+        """
+        Отбирает рецепты с любым из тегов slugs, а при match_all
+        только рецепты со всеми этими тегами.
+
+        Условие проверяется подзапросом Exists по промежуточной таблице,
+        строки рецептов не размножаются и DISTINCT не нужен.
+        """
+        slugs = set(slugs)
+        tags = RecipeTag.objects.filter(
+            recipe=OuterRef('pk'), tag__slug__in=slugs)
+        if match_all:
+            tags = tags.values('recipe').annotate(
+                count=Count('tag')).filter(count=len(slugs))
+        return self.annotate(has_tags=Exists(tags)).filter(has_tags=True)
+
+    def feed(self, user):
+        """
+        Рецепты из ленты подписок пользователя.
+
+        Выборка идёт по таблице ленты (FeedEntry), а дата записи ленты
+        добавляется как feed_date для сортировки по её индексу.
+        """
+        return self.filter(feed_entries__user=user).annotate(
+            feed_date=F('feed_entries__pub_date'))
+
+    def for_view(self, user):
+        """
+        Готовит рецепты к чтению одним проходом.
+
+        Подписка на автора вычисляется подзапросом Exists, теги
+        и ингредиенты подгружаются заранее в порядке id, как и
+        в recipes.fast_serializers. Флаги избранного и списка покупок
+        берутся из кеша членства (recipes.membership).
+        """
+        return self.prefetch_related(
+            Prefetch('author', queryset=User.objects.annotate(
+                is_subscribed=is_subscribed(user))),
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch('recipe_ingredients',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient').order_by('id')),
+        )
+
+
 class Recipe(models.Model):
     """Модель, представляющая рецепт для приготовления блюда."""
 
@@ -74,6 +214,10 @@ class Recipe(models.Model):
         verbose_name='Изображение рецепта',
         null=True,
         blank=True,)
+    renditions_ready = models.BooleanField(
+        verbose_name='Уменьшенные копии изображения готовы',
+        default=False,
+        editable=False,)
     text = models.TextField(
         verbose_name='Описание рецепта')
     ingredients = models.ManyToManyField(
@@ -82,6 +226,7 @@ class Recipe(models.Model):
         verbose_name='Список ингредиентов')
     tags = models.ManyToManyField(
         Tag,
+        through='RecipeTag',
         related_name='recipes',
         verbose_name='Тег')
     cooking_time = models.PositiveIntegerField(
@@ -92,18 +237,63 @@ class Recipe(models.Model):
         verbose_name='Дата публикации рецепта',
         auto_now_add=True,
         db_index=True,)
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения рецепта',
+        auto_now=True,)
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,)
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['pub_date', 'id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['author', 'pub_date'],
+                         name='recipe_author_pub_date_idx'),
+            SearchVectorIndex(fields=['search_vector'],
+                              name='recipe_search_vector_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
-    @staticmethod
-    def is_favorited(recipe, user):
-        return Favorite.objects.filter(recipe=recipe, user=user).exists()
+
+class RecipeTag(models.Model):
+    """Модель, представляющая связь рецепта с тегом."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='recipe_tags',
+        on_delete=models.CASCADE,)
+    tag = models.ForeignKey(
+        Tag,
+        related_name='recipe_tags',
+        on_delete=models.CASCADE,)
+
+    class Meta:
+        db_table = 'recipes_recipe_tags'
+        verbose_name = 'Тег рецепта'
+        verbose_name_plural = 'Теги рецептов'
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'tag'],
+                                    name='unique_recipe_tag')
+        ]
+        indexes = [
+            models.Index(fields=['tag', 'recipe'],
+                         name='recipe_tag_tag_recipe_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} - {self.tag}'
 
 
 class RecipeIngredient(models.Model):
@@ -187,3 +377,81 @@ class ShoppingList(models.Model):
 
     def __str__(self):
         return f'{self.user} добавил {self.recipe} в список покупок'
+
+
+class ShoppingCartIngredient(models.Model):
+    """
+    Модель, представляющая строку сводки списка покупок: суммарное
+    количество ингредиента во всех рецептах списка пользователя.
+
+    Поддерживается при изменении списка покупок и ингредиентов
+    рецептов (recipes.shopping_cart), чтобы сводка читалась
+    выборкой по индексу (user, ingredient).
+    """
+
+    user = models.ForeignKey(
+        User,
+        related_name='shopping_cart_ingredients',
+        on_delete=models.CASCADE,)
+    ingredient = models.ForeignKey(
+        Ingredient,
+        related_name='+',
+        on_delete=models.CASCADE,)
+    amount = models.FloatField(
+        verbose_name='Количество ингредиента',)
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Сводка списка покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_cart_ingredient',
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} — {self.amount} в списке {self.user}'
+
+
+class FeedEntry(models.Model):
+    """
+    Модель, представляющая запись ленты подписок пользователя.
+
+    Заполняется при публикации рецепта и при подписке на автора,
+    чтобы чтение ленты было выборкой по индексу (user, pub_date).
+    """
+
+    user = models.ForeignKey(
+        User,
+        related_name='feed_entries',
+        on_delete=models.CASCADE,)
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='feed_entries',
+        on_delete=models.CASCADE,)
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE,)
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации рецепта',)
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry',
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-recipe'],
+                         name='feed_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
@@ -1,8 +1,57 @@
 from django.conf import settings
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class CustomCursorPagination(CursorPagination):
+    """Постраничный вывод по курсору, без подсчёта общего количества."""
+    page_size = int(settings.PAGE_SIZE)
+    page_size_query_param = 'limit'
 
 
 class CustomPagination(PageNumberPagination):
-    """Пагинатор проекта."""
+    """
+    Пагинатор проекта.
+
+    По умолчанию постраничный вывод по номеру страницы. Если в запросе
+    передан cursor или pagination=cursor, а для представления задан
+    порядок cursor_ordering, страницы выбираются по курсору.
+    """
     page_size = settings.PAGE_SIZE
     page_size_query_param = 'limit'
+    mode_query_param = 'pagination'
+    cursor_mode = 'cursor'
+    cursor_ordering = None
+
+    def is_cursor_mode(self, request):
+        if self.cursor_ordering is None:
+            return False
+        return (CustomCursorPagination.cursor_query_param
+                in request.query_params
+                or request.query_params.get(self.mode_query_param)
+                == self.cursor_mode)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.is_cursor_mode(request):
+            self.cursor_paginator = CustomCursorPagination()
+            self.cursor_paginator.ordering = self.cursor_ordering
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(CustomPagination):
+    cursor_ordering = ('-pub_date', '-id')
+
+
+class UserPagination(CustomPagination):
+    cursor_ordering = ('-date_joined', '-id')
+
+
+class FeedPagination(CustomCursorPagination):
+    ordering = ('-feed_date', '-id')
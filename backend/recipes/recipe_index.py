@@ -0,0 +1,119 @@
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from itertools import chain
+
+from django.core.cache import cache
+
+from config.db_router import use_primary
+
+from .cache import bump_version, get_version
+from .models import RecipeIngredient
+
+CHANGE_KEY = 'recipe_index:change:{}'
+# Больше изменений журнал не применяет: индекс строится заново.
+MAX_CHANGES = 1000
+
+
+class RecipeIngredientIndex:
+    """
+    Обратный индекс «ингредиент → рецепты» в памяти процесса.
+
+    Для каждого ингредиента хранится отсортированный массив id рецептов,
+    для каждого рецепта — массив id его ингредиентов. Изменения рецептов
+    записываются в кеш как журнал версий: процесс, отставший от текущей
+    версии, перечитывает только изменённые рецепты, а при пропуске
+    в журнале перестраивает индекс целиком.
+    """
+    version_name = 'recipe_ingredients'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings = {}
+        self._ingredients = {}
+
+    def record_change(self, recipe_id):
+        """Записывает в журнал, что состав рецепта recipe_id изменился."""
+        version = bump_version(self.version_name)
+        cache.set(CHANGE_KEY.format(version), recipe_id)
+
+    def build(self):
+        postings = defaultdict(lambda: array('I'))
+        ingredients = defaultdict(lambda: array('I'))
+        rows = RecipeIngredient.objects.order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('ingredient_id', 'recipe_id').iterator()
+        for ingredient_id, recipe_id in rows:
+            postings[ingredient_id].append(recipe_id)
+            ingredients[recipe_id].append(ingredient_id)
+        self._postings = dict(postings)
+        self._ingredients = dict(ingredients)
+
+    def apply_changes(self, recipe_ids):
+        current = defaultdict(lambda: array('I'))
+        rows = RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by('ingredient_id').values_list('recipe_id', 'ingredient_id')
+        for recipe_id, ingredient_id in rows:
+            current[recipe_id].append(ingredient_id)
+
+        for recipe_id in recipe_ids:
+            old = set(self._ingredients.pop(recipe_id, ()))
+            new = current.get(recipe_id)
+            if new:
+                self._ingredients[recipe_id] = new
+            new = set(new or ())
+            for ingredient_id in old - new:
+                posting = self._postings[ingredient_id]
+                del posting[bisect_left(posting, recipe_id)]
+            for ingredient_id in new - old:
+                insort(self._postings.setdefault(
+                    ingredient_id, array('I')), recipe_id)
+
+    def ensure_fresh(self):
+        version = get_version(self.version_name)
+        if self._version == version:
+            return
+        with self._lock, use_primary():
+            if self._version == version:
+                return
+            if (self._version is not None
+                    and 0 < version - self._version <= MAX_CHANGES):
+                keys = [CHANGE_KEY.format(number)
+                        for number in range(self._version + 1, version + 1)]
+                changes = cache.get_many(keys)
+                if len(changes) == len(keys):
+                    self.apply_changes(set(changes.values()))
+                    self._version = version
+                    return
+            self.build()
+            self._version = version
+
+    def cover(self, ingredient_ids, limit):
+        """
+        Возвращает до limit рецептов, содержащих хотя бы один
+        из ingredient_ids, в виде (recipe_id, совпало, id недостающих).
+
+        Первыми идут рецепты с наименьшим числом недостающих
+        ингредиентов, затем с наибольшим числом совпавших.
+        """
+        self.ensure_fresh()
+        have = set(ingredient_ids)
+        with self._lock:
+            matched = Counter(chain.from_iterable(
+                self._postings.get(ingredient_id, ())
+                for ingredient_id in have))
+            best = heapq.nsmallest(
+                limit, matched.items(), key=lambda item: (
+                    len(self._ingredients[item[0]]) - item[1],
+                    -item[1],
+                    -item[0]))
+            return [(recipe_id, count, [
+                ingredient_id for ingredient_id in self._ingredients[recipe_id]
+                if ingredient_id not in have]) for recipe_id, count in best]
+
+
+recipe_index = RecipeIngredientIndex()
@@ -0,0 +1,197 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from config.db_router import use_primary
+
+from .cache import bump_version, get_versions
+from .conditional import VALIDATOR_HEADERS, not_modified, set_validators
+from .models import Recipe
+
+LIST_QUERY_PARAMS = frozenset(
+    ('tags', 'tags_mode', 'author', 'page', 'limit', 'cursor',
+     'pagination', 'fields', 'omit'))
+INTEGER_QUERY_PARAMS = ('author', 'page', 'limit')
+RECIPES_VERSION = 'recipes'
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 0.05
+LOCK_WAIT_STEPS = 40
+
+
+def author_version(author_id):
+    return f'recipes:author:{author_id}'
+
+
+def tag_version(slug):
+    return f'recipes:tag:{slug}'
+
+
+def recipe_version(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+def invalidate(recipe_id, author_id, tag_slugs=()):
+    """
+    После фиксации транзакции сбрасывает закешированные ответы,
+    которые могут содержать рецепт: его страницу, общий список
+    и списки с отбором по автору и тегам рецепта.
+    """
+    names = [RECIPES_VERSION, recipe_version(recipe_id),
+             author_version(author_id)]
+    names.extend(tag_version(slug) for slug in tag_slugs)
+    bump_on_commit(names)
+
+
+def bump_on_commit(names):
+    def bump():
+        for name in names:
+            bump_version(name)
+
+    transaction.on_commit(bump)
+
+
+def invalidate_recipe(recipe_id):
+    """Сбрасывает ответы по рецепту, читая его автора и теги из базы."""
+    rows = Recipe.objects.filter(pk=recipe_id).values_list(
+        'author_id', 'tags__slug')
+    if rows:
+        invalidate(recipe_id, rows[0][0],
+                   [slug for _, slug in rows if slug is not None])
+
+
+def invalidate_author(author_id):
+    """Сбрасывает ответы со всеми рецептами автора."""
+    rows = Recipe.objects.filter(author_id=author_id).values_list(
+        'id', 'tags__slug')
+    names = {RECIPES_VERSION, author_version(author_id)}
+    for recipe_id, slug in rows:
+        names.add(recipe_version(recipe_id))
+        if slug is not None:
+            names.add(tag_version(slug))
+    bump_on_commit(names)
+
+
+def get_or_build(key, build, timeout):
+    """
+    Возвращает значение из кеша или строит его через build.
+
+    Защищает от одновременного построения одного ключа: значение
+    строит только получивший блокировку запрос, остальные ждут его
+    результата и лишь по истечении ожидания строят значение сами.
+    build возвращает None, если результат кешировать нельзя.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+    lock = f'{key}:lock'
+    locked = cache.add(lock, 1, LOCK_TIMEOUT)
+    if not locked:
+        for _ in range(LOCK_WAIT_STEPS):
+            time.sleep(LOCK_WAIT)
+            value = cache.get(key)
+            if value is not None:
+                return value
+    try:
+        with use_primary():
+            value = build()
+        if value is not None:
+            cache.set(key, value, timeout)
+    finally:
+        if locked:
+            cache.delete(lock)
+    return value
+
+
+class AnonymousResponseCacheMixin:
+    """
+    Общий кеш ответов list и retrieve для анонимных пользователей.
+
+    Ключ строится из нормализованных параметров запроса и версий
+    данных, от которых зависит ответ: общего списка рецептов, автора,
+    тегов или отдельного рецепта. Сигналы увеличивают только версии
+    изменённых данных, поэтому остальные записи кеша остаются в силе.
+
+    Вместе с данными хранятся заголовки ETag и Last-Modified ответа,
+    по которым условный запрос получает 304 прямо из кеша.
+    """
+    response_cache_timeout = settings.RESPONSE_CACHE_TIMEOUT
+
+    def normalize_list_query(self, query_params):
+        """
+        Приводит параметры списка к каноническому виду или возвращает
+        None, если запрос с такими параметрами не кешируется.
+        """
+        if not LIST_QUERY_PARAMS.issuperset(query_params):
+            return None
+        query = {name: query_params[name]
+                 for name in LIST_QUERY_PARAMS if name in query_params}
+        for name in INTEGER_QUERY_PARAMS:
+            if name in query:
+                try:
+                    query[name] = int(query[name])
+                except ValueError:
+                    return None
+        if 'tags' in query:
+            query['tags'] = sorted(set(query_params.getlist('tags')))
+        return query
+
+    def get_list_versions(self, query):
+        if 'author' in query:
+            return [author_version(query['author'])]
+        if 'tags' in query:
+            return [tag_version(slug) for slug in query['tags']]
+        return [RECIPES_VERSION]
+
+    def get_response_cache_key(self, request, prefix, query, versions):
+        versions = get_versions(versions + ['tags', 'ingredients'])
+        digest = hashlib.md5(repr((
+            request.get_host(), sorted(query.items()),
+            sorted(versions.items()),
+        )).encode()).hexdigest()
+        return f'response:{prefix}:{digest}'
+
+    def cached_response(self, key, view, request, *args, **kwargs):
+        response = None
+
+        def build():
+            nonlocal response
+            response = view(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                return response.data, {
+                    name: response[name]
+                    for name in VALIDATOR_HEADERS if name in response}
+            return None
+
+        value = get_or_build(key, build, self.response_cache_timeout)
+        if response is not None:
+            return response
+        data, headers = value
+        cached = not_modified(request, headers)
+        if cached is None:
+            cached = set_validators(Response(data), headers)
+        return cached
+
+    def list(self, request, *args, **kwargs):
+        query = None
+        if request.user.is_anonymous:
+            query = self.normalize_list_query(request.query_params)
+        if query is None:
+            return super().list(request, *args, **kwargs)
+        key = self.get_response_cache_key(
+            request, 'list', query, self.get_list_versions(query))
+        return self.cached_response(
+            key, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if request.user.is_authenticated or request.query_params:
+            return super().retrieve(request, *args, **kwargs)
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        key = self.get_response_cache_key(
+            request, 'detail', {'pk': pk}, [recipe_version(pk)])
+        return self.cached_response(
+            key, super().retrieve, request, *args, **kwargs)
@@ -1,13 +1,19 @@
 import re
+from collections import Counter
+
 import webcolors
 
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 from drf_extra_fields.fields import Base64ImageField
 
+from .images import rendition_urls, schedule_renditions
+from .membership import get_recipe_ids
+from .signals import recipe_ingredients_changed
 from .models import (Tag, Recipe, Ingredient, RecipeIngredient,
                      Favorite,
-                     ShoppingList)
+                     ShoppingList, delete_without_signals)
 from users.serializers import UserDetailSerializer
 
 
@@ -70,6 +76,15 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class ShoppingCartIngredientSerializer(serializers.Serializer):
+    """Сериализатор для строк сводки списка покупок (get_summary)."""
+
+    id = serializers.IntegerField(source='ingredient_id')
+    name = serializers.CharField()
+    measurement_unit = serializers.CharField()
+    amount = serializers.FloatField(source='total')
+
+
 class RecipeViewSerializer(serializers.ModelSerializer):
     """Сериализатор для просмотра списка рецептов."""
 
@@ -83,22 +98,34 @@ class RecipeViewSerializer(serializers.ModelSerializer):
         method_name='get_is_favorited')
     is_in_shopping_cart = serializers.SerializerMethodField(
         method_name='get_is_in_shopping_cart')
+    renditions = serializers.SerializerMethodField(
+        method_name='get_renditions')
+
+    def get_renditions(self, obj):
+        return rendition_urls(obj, self.context.get('request'))
+
+    def is_member(self, model, obj):
+        """
+        Проверяет рецепт по множеству id из кеша членства. Множество
+        читается один раз на запрос и хранится в общем контексте.
+        """
+        key = f'{model._meta.model_name}_ids'
+        if key not in self.context:
+            self.context[key] = get_recipe_ids(
+                model, self.context['request'].user)
+        return obj.id in self.context[key]
 
     def get_is_favorited(self, obj):
-        return Recipe.is_favorited(obj, self.context['request'].user.id)
+        return self.is_member(Favorite, obj)
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-
-        if user.is_anonymous:
-            return False
-        return ShoppingList.objects.filter(user=user, recipe=obj).exists()
+        return self.is_member(ShoppingList, obj)
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'renditions',
+                  'text', 'cooking_time')
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -108,24 +135,48 @@ class RecipeSerializer(serializers.ModelSerializer):
     ingredients = RecipeChangeIngredientSerializer(many=True)
     image = Base64ImageField(required=False, allow_null=True)
 
+    def validate_ingredients(self, value):
+        """
+        Проверяет все ингредиенты одним запросом.
+
+        Повторы и несуществующие id возвращаются одной ошибкой.
+        """
+        ids = Counter(ingredient['id'] for ingredient in value)
+        errors = []
+        duplicates = sorted(pk for pk, count in ids.items() if count > 1)
+        if duplicates:
+            errors.append('Ингредиенты повторяются: '
+                          f'{", ".join(map(str, duplicates))}')
+        existing = set(Ingredient.objects.filter(
+            pk__in=ids).values_list('pk', flat=True))
+        missing = sorted(set(ids) - existing)
+        if missing:
+            errors.append('Ингредиенты не найдены: '
+                          f'{", ".join(map(str, missing))}')
+        if errors:
+            raise serializers.ValidationError(errors)
+        return value
+
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
 
         recipe = Recipe.objects.create(**validated_data)
-
-        for tag in tags:
-            recipe.tags.add(tag)
-
-        recipe_ingredients = []
-        for ingredient in ingredients:
-            recipe_ingredients.append(RecipeIngredient(
-                recipe=recipe,
-                ingredient=get_object_or_404(Ingredient, pk=ingredient['id']),
-                amount=ingredient['amount']))
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        schedule_renditions(recipe)
+        recipe.tags.set(tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe,
+                             ingredient_id=ingredient['id'],
+                             amount=ingredient['amount'])
+            for ingredient in ingredients)
+        Recipe.objects.filter(pk=recipe.pk).update_search_vector()
+        recipe_ingredients_changed.send(
+            sender=Recipe, recipe_id=recipe.pk,
+            ingredient_ids={ingredient['id'] for ingredient in ingredients})
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
@@ -133,27 +184,64 @@ class RecipeSerializer(serializers.ModelSerializer):
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get(
             'text', instance.text)
-        instance.image = validated_data.get('image', instance.image)
+        if 'image' in validated_data:
+            instance.image = validated_data['image']
+            instance.renditions_ready = False
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time)
         instance.save()
+        if 'image' in validated_data:
+            schedule_renditions(instance)
 
         if tags is not None:
             instance.tags.set(tags)
 
         if ingredients:
-            RecipeIngredient.objects.filter(recipe=instance).delete()
-            recipe_ingredients = []
-            for ingredient in ingredients:
-                recipe_ingredients.append(RecipeIngredient(
-                    recipe=instance,
-                    ingredient=get_object_or_404(Ingredient,
-                                                 pk=ingredient['id']),
-                    amount=ingredient['amount']
-                ))
-            RecipeIngredient.objects.bulk_create(recipe_ingredients)
+            changed = self.update_ingredients(instance, ingredients)
+            if changed:
+                recipe_ingredients_changed.send(
+                    sender=Recipe, recipe_id=instance.pk,
+                    ingredient_ids=changed)
+        Recipe.objects.filter(pk=instance.pk).update_search_vector()
         return instance
 
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """
+        Применяет к ингредиентам рецепта только разницу:
+        добавляет новые, меняет количество у изменённых, удаляет лишние.
+
+        Все три шага пакетные и построчных сигналов не отправляют.
+        Возвращает id затронутых ингредиентов для сигнала
+        recipe_ingredients_changed.
+        """
+        amounts = {ingredient['id']: ingredient['amount']
+                   for ingredient in ingredients}
+        current = {item.ingredient_id: item
+                   for item in recipe.recipe_ingredients.all()}
+
+        removed = set(current) - set(amounts)
+        if removed:
+            delete_without_signals(RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed))
+
+        changed = []
+        for ingredient_id, item in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
+
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe,
+                             ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current)
+        return (set(amounts) ^ set(current)
+                | {item.ingredient_id for item in changed})
+
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
@@ -168,8 +256,32 @@ class FavoriteSerializer(serializers.ModelSerializer):
         fields = ('id', 'user', 'recipe')
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетного добавления или удаления."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPES_BATCH_LIMIT)
+
+
 class RecipeSchemeSerializer(serializers.ModelSerializer):
+    renditions = serializers.SerializerMethodField(
+        method_name='get_renditions')
+
+    def get_renditions(self, obj):
+        return rendition_urls(obj, self.context.get('request'))
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'renditions', 'cooking_time')
+
+
+class RecipeCoverageSerializer(RecipeSchemeSerializer):
+    """Сериализатор рецепта с совпавшими и недостающими ингредиентами."""
+
+    matched = serializers.IntegerField(read_only=True)
+    missing = IngredientSerializer(many=True, read_only=True)
+
+    class Meta(RecipeSchemeSerializer.Meta):
+        fields = RecipeSchemeSerializer.Meta.fields + ('matched', 'missing')
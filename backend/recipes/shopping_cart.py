@@ -0,0 +1,127 @@
+"""
+Сводка списка покупок: суммарное количество каждого ингредиента
+во всех рецептах списка пользователя (ShoppingCartIngredient).
+
+При изменении списка или ингредиентов рецептов пересчитываются
+только затронутые строки (пользователь, ингредиент) тем же
+суммированием в базе, что и при полной сборке, поэтому сводка
+совпадает с суммой по рецептам списка.
+
+Сводки списков, существовавших до появления таблицы, собираются
+командой rebuild_shopping_carts или целиком при первом изменении
+списка. До этого get_summary суммирует количество по рецептам.
+"""
+from django.db import transaction
+from django.db.models import F, Sum
+
+from users.models import User
+from .models import RecipeIngredient, ShoppingCartIngredient, ShoppingList
+
+BATCH_SIZE = 500
+
+
+def recipe_ingredient_ids(recipe_ids):
+    """Подзапрос с ингредиентами рецептов recipe_ids."""
+    return RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids).values('ingredient_id')
+
+
+def cart_user_ids(recipe_id):
+    """Подзапрос с пользователями, у которых рецепт в списке покупок."""
+    return ShoppingList.objects.filter(recipe_id=recipe_id).values('user_id')
+
+
+def recalculate(user_ids, ingredient_ids):
+    """
+    Пересчитывает строки сводки пользователей user_ids по ингредиентам
+    ingredient_ids из их списков покупок. Остальные строки сводки
+    не меняются, а сводки, которые ещё не собраны, собираются целиком.
+
+    Оба аргумента — списки id или подзапросы. Строки пользователей
+    блокируются, чтобы одновременные пересчёты одной сводки
+    выполнялись по очереди.
+    """
+    with transaction.atomic(savepoint=False):
+        users = list(User.objects.select_for_update().filter(
+            pk__in=user_ids).order_by('pk').values_list(
+            'pk', 'shopping_cart_summary_ready'))
+        ready = [pk for pk, is_ready in users if is_ready]
+        for start in range(0, len(ready), BATCH_SIZE):
+            recalculate_users(
+                ready[start:start + BATCH_SIZE], ingredient_ids)
+        build([pk for pk, is_ready in users if not is_ready])
+
+
+def recalculate_users(user_ids, ingredient_ids=None):
+    """
+    Заменяет строки сводки пользователей суммами из их списков покупок:
+    по ингредиентам ingredient_ids или по всем, если они не заданы.
+    """
+    totals = RecipeIngredient.objects.filter(
+        recipe__shopping_cart__user__in=user_ids)
+    rows = ShoppingCartIngredient.objects.filter(user_id__in=user_ids)
+    if ingredient_ids is not None:
+        totals = totals.filter(ingredient_id__in=ingredient_ids)
+        rows = rows.filter(ingredient_id__in=ingredient_ids)
+    totals = totals.values_list(
+        'recipe__shopping_cart__user', 'ingredient_id'
+    ).annotate(total=Sum('amount')).order_by()
+    rows.delete()
+    create_rows([
+        ShoppingCartIngredient(
+            user_id=user_id, ingredient_id=ingredient_id, amount=total)
+        for user_id, ingredient_id, total in totals])
+
+
+def create_rows(rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        ShoppingCartIngredient.objects.bulk_create(
+            rows[start:start + BATCH_SIZE])
+
+
+def build(user_ids):
+    """Собирает сводки пользователей user_ids целиком и отмечает их."""
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        chunk = user_ids[start:start + BATCH_SIZE]
+        recalculate_users(chunk)
+        User.objects.filter(pk__in=chunk).update(
+            shopping_cart_summary_ready=True)
+
+
+def build_missing(rebuild=False):
+    """
+    Собирает ещё не собранные сводки, а с rebuild — все.
+
+    Возвращает количество собранных сводок.
+    """
+    with transaction.atomic():
+        users = User.objects.select_for_update().order_by('pk')
+        if not rebuild:
+            users = users.filter(shopping_cart_summary_ready=False)
+        user_ids = list(users.values_list('pk', flat=True))
+        build(user_ids)
+    return len(user_ids)
+
+
+def get_summary(user):
+    """
+    Сводка списка покупок пользователя по названиям ингредиентов:
+    словари ingredient_id, name, measurement_unit и total.
+
+    Пока сводка пользователя не собрана, количество суммируется
+    по рецептам списка покупок.
+    """
+    if user.shopping_cart_summary_ready:
+        return ShoppingCartIngredient.objects.filter(user=user).values(
+            'ingredient_id',
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+            total=F('amount'),
+        ).order_by('name')
+    return RecipeIngredient.objects.filter(
+        recipe__shopping_cart__user=user
+    ).values(
+        'ingredient_id',
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+    ).annotate(total=Sum('amount')).order_by('name')
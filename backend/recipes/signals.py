@@ -0,0 +1,252 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import Signal, receiver
+
+from users.models import Follow, User
+from . import feed, response_cache, shopping_cart
+from .cache import bump_version
+from .membership import invalidate_recipe_ids
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     RecipeTag, ShoppingList, Tag)
+from .recipe_index import recipe_index
+
+# Поля автора, которые выводятся в рецептах.
+AUTHOR_PROFILE_FIELDS = frozenset(
+    ('username', 'first_name', 'last_name', 'email'))
+
+# Ингредиенты рецепта изменены пакетно, без построчных сигналов
+# RecipeIngredient: recipe_id и ingredient_ids затронутых ингредиентов.
+# Отправляется вместе с сохранением рецепта, поэтому updated_at
+# и кеш ответов обновляют сигналы самого рецепта.
+recipe_ingredients_changed = Signal()
+memberships_changed = Signal()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredients_version(**kwargs):
+    """Сбрасывает кеш и поисковый индекс после изменения ингредиентов."""
+    bump_version('ingredients')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(**kwargs):
+    """Сбрасывает кеш тегов после их изменения."""
+    bump_version('tags')
+
+
+def counter_delta(signal, created):
+    """Изменение счётчика: +1 при создании записи, -1 при удалении."""
+    if signal is post_delete:
+        return -1
+    return 1 if created else 0
+
+
+def shift_counter(field, delta):
+    """
+    Выражение для сдвига счётчика field на delta не ниже нуля: счётчики
+    строк, созданных до их появления, могут отставать от данных
+    до запуска recount.
+    """
+    return Greatest(F(field) + delta, 0)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def update_favorites_count(signal, instance, created=False, **kwargs):
+    """Поддерживает счётчик избранного у рецепта."""
+    delta = counter_delta(signal, created)
+    if delta:
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            favorites_count=shift_counter('favorites_count', delta))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def update_recipes_count(signal, instance, created=False, **kwargs):
+    """Поддерживает счётчик рецептов у автора."""
+    delta = counter_delta(signal, created)
+    if delta:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=shift_counter('recipes_count', delta))
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingList)
+def update_membership(signal, sender, instance, created=False, **kwargs):
+    """Сбрасывает кеш членства пользователя."""
+    if counter_delta(signal, created):
+        invalidate_recipe_ids(sender, instance.user_id)
+
+
+@receiver(memberships_changed, sender=Favorite)
+def update_favorites_count_batch(added, removed, **kwargs):
+    """Поддерживает счётчик избранного при пакетных изменениях."""
+    for recipe_ids, delta in ((added, 1), (removed, -1)):
+        if recipe_ids:
+            Recipe.objects.filter(pk__in=recipe_ids).update(
+                favorites_count=shift_counter('favorites_count', delta))
+
+
+@receiver(memberships_changed, sender=Favorite)
+@receiver(memberships_changed, sender=ShoppingList)
+def update_membership_batch(sender, user_id, added, removed, **kwargs):
+    """Сбрасывает кеш членства после пакетных изменений."""
+    if added or removed:
+        invalidate_recipe_ids(sender, user_id)
+
+
+@receiver(post_save, sender=ShoppingList)
+def add_to_cart_summary(instance, created, **kwargs):
+    """Добавляет ингредиенты рецепта в сводку списка покупок."""
+    if created:
+        shopping_cart.recalculate(
+            [instance.user_id],
+            shopping_cart.recipe_ingredient_ids([instance.recipe_id]))
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def remember_cart_ingredients(instance, **kwargs):
+    """
+    Запоминает ингредиенты рецепта до удаления из списка покупок:
+    при удалении рецепта они могут быть удалены раньше записи списка.
+    """
+    instance.ingredient_ids = list(shopping_cart.recipe_ingredient_ids(
+        [instance.recipe_id]).values_list('ingredient_id', flat=True))
+
+
+@receiver(post_delete, sender=ShoppingList)
+def remove_from_cart_summary(instance, **kwargs):
+    """Вычитает ингредиенты рецепта из сводки списка покупок."""
+    shopping_cart.recalculate([instance.user_id], instance.ingredient_ids)
+
+
+@receiver(memberships_changed, sender=ShoppingList)
+def update_cart_summary_batch(user_id, added, removed, **kwargs):
+    """Обновляет сводку списка покупок после пакетных изменений."""
+    shopping_cart.recalculate(
+        [user_id], shopping_cart.recipe_ingredient_ids([*added, *removed]))
+
+
+@receiver(recipe_ingredients_changed, sender=Recipe)
+def update_cart_summaries(recipe_id, ingredient_ids, **kwargs):
+    """
+    Пересчитывает затронутые ингредиенты в сводках списков покупок
+    с рецептом одним пересчётом на рецепт.
+    """
+    shopping_cart.recalculate(
+        shopping_cart.cart_user_ids(recipe_id), ingredient_ids)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def update_cart_summaries_row(instance, **kwargs):
+    """
+    Пересчитывает ингредиент в сводках списков покупок с рецептом
+    после построчного изменения, например в админке.
+    """
+    shopping_cart.recalculate(
+        shopping_cart.cart_user_ids(instance.recipe_id),
+        [instance.ingredient_id])
+
+
+@receiver(recipe_ingredients_changed, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def record_recipe_index_change(sender, instance=None, recipe_id=None,
+                               **kwargs):
+    """Записывает изменение состава рецепта в журнал обратного индекса."""
+    if instance is not None:
+        recipe_id = (instance.pk if sender is Recipe
+                     else instance.recipe_id)
+    transaction.on_commit(lambda: recipe_index.record_change(recipe_id))
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, **kwargs):
+    """Раскладывает новый рецепт по лентам подписчиков автора."""
+    if created:
+        feed.fan_out(instance)
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def update_feed(signal, instance, created=False, **kwargs):
+    """Заполняет или очищает ленту при подписке и отписке."""
+    delta = counter_delta(signal, created)
+    if delta > 0:
+        feed.backfill(instance.user_id, instance.following_id)
+    elif delta < 0:
+        feed.remove(instance.user_id, instance.following_id)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(pre_delete, sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=RecipeTag)
+def invalidate_recipe_responses(sender, instance, **kwargs):
+    """Сбрасывает закешированные ответы с изменённым рецептом."""
+    response_cache.invalidate_recipe(
+        instance.pk if sender is Recipe else instance.recipe_id)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=RecipeTag)
+def touch_recipe(instance, **kwargs):
+    """
+    Отмечает в updated_at построчное изменение ингредиентов или тегов
+    рецепта, например в админке.
+    """
+    Recipe.objects.filter(pk=instance.recipe_id).touch()
+
+
+@receiver(m2m_changed, sender=RecipeTag)
+def touch_recipe_tags(instance, action, reverse, pk_set, **kwargs):
+    """Отмечает в updated_at теги, добавленные к рецепту или снятые с него."""
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        Recipe.objects.filter(pk=instance.pk).touch()
+    elif reverse and action in ('post_add', 'post_remove'):
+        Recipe.objects.filter(pk__in=pk_set).touch()
+    elif reverse and action == 'pre_clear':
+        instance.recipes.touch()
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_ingredient_recipes(instance, created, **kwargs):
+    """Отмечает изменёнными рецепты с переименованным ингредиентом."""
+    if not created:
+        Recipe.objects.filter(ingredients=instance).touch()
+
+
+@receiver(post_save, sender=Tag)
+def touch_tag_recipes(instance, created, **kwargs):
+    """Отмечает изменёнными рецепты с изменённым тегом."""
+    if not created:
+        instance.recipes.touch()
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(instance, created, update_fields, **kwargs):
+    """
+    Отмечает изменёнными рецепты автора, данные которого выводятся
+    в рецептах, и сбрасывает закешированные ответы с ними. Сохранения
+    без этих полей (например, last_login) рецептов не касаются.
+    """
+    if created or (update_fields is not None
+                   and AUTHOR_PROFILE_FIELDS.isdisjoint(update_fields)):
+        return
+    if instance.recipes.touch():
+        response_cache.invalidate_author(instance.pk)
+
+
+@receiver(m2m_changed, sender=RecipeTag)
+def invalidate_recipe_tag_responses(instance, action, reverse, pk_set,
+                                    **kwargs):
+    """Сбрасывает ответы по тегам, добавленным к рецепту или снятым с него."""
+    if reverse:
+        if action.startswith('post_'):
+            transaction.on_commit(lambda: bump_version('tags'))
+    elif action == 'pre_clear':
+        response_cache.invalidate_recipe(instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        response_cache.invalidate(
+            instance.pk, instance.author_id,
+            Tag.objects.filter(pk__in=pk_set).values_list('slug', flat=True))
@@ -1,23 +1,55 @@
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.viewsets import ModelViewSet
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import (SAFE_METHODS, AllowAny,
+                                        IsAuthenticated)
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 
+from config.db_router import ReplicaReadMixin, use_primary
 from users.permissions import IsAdminOrAuthor
-from .pagination import CustomPagination
-from .filters import IngredientFilter, RecipeFilter
-from .models import (Tag, Recipe, Ingredient, Favorite,
-                     ShoppingList, RecipeIngredient)
+from .cache import VersionedCacheMixin
+from .conditional import ConditionalRecipeMixin
+from .ingredient_index import ingredient_index
+from .membership import lock_user
+from .pagination import FeedPagination, RecipePagination
+from .recipe_index import recipe_index
+from .response_cache import AnonymousResponseCacheMixin
+from .shopping_cart import get_summary
+from .signals import memberships_changed
+from .renderers import (ShoppingCartCSVRenderer, ShoppingCartPDFRenderer,
+                        ShoppingCartTextRenderer)
+from .fast_serializers import (RECIPE_FIELDS, RecipeRowSerializer,
+                               recipe_rows)
+from .feed import pull
+from .fieldsets import SparseFieldsetMixin
+from .filters import RecipeFilter
+from .models import (Tag, Recipe, Ingredient, Favorite, ShoppingList,
+                     delete_without_signals)
 from .serializers import (TagSerializer, RecipeSerializer,
                           IngredientSerializer, RecipeViewSerializer,
-                          RecipeSchemeSerializer)
+                          RecipeSchemeSerializer, RecipeCoverageSerializer,
+                          RecipeIdsSerializer,
+                          ShoppingCartIngredientSerializer)
 
 
-class TagViewSet(ModelViewSet):
+def get_positive_int(request, name, default):
+    """Возвращает положительное целое из параметра запроса или default."""
+    try:
+        value = int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+class TagViewSet(ReplicaReadMixin, VersionedCacheMixin, ModelViewSet):
+    cache_version_name = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
@@ -30,12 +62,26 @@ class TagViewSet(ModelViewSet):
         return context
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin, SparseFieldsetMixin,
+                    AnonymousResponseCacheMixin, ConditionalRecipeMixin,
+                    ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAdminOrAuthor,)
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
-    filter_class = RecipeFilter
+    filterset_class = RecipeFilter
+
+    row_actions = ('list', 'retrieve', 'feed')
+    fieldset_actions = row_actions
+    fieldset_fields = RECIPE_FIELDS
+
+    def get_queryset(self):
+        if self.action in self.row_actions:
+            return recipe_rows(
+                Recipe.objects.all(), self.get_fieldset() or RECIPE_FIELDS)
+        if self.request.method in SAFE_METHODS:
+            return Recipe.objects.for_view(self.request.user)
+        return Recipe.objects.all()
 
     def get_serializer_context(self):
         """Метод для передачи контекста. """
@@ -47,6 +93,8 @@ class RecipeViewSet(ModelViewSet):
     def get_serializer_class(self):
         if self.request.method in ('POST', 'PATCH', 'DELETE'):
             return RecipeSerializer
+        if self.action in self.row_actions:
+            return RecipeRowSerializer
         return RecipeViewSerializer
 
     def perform_create(self, serializer):
@@ -73,60 +121,194 @@ class RecipeViewSet(ModelViewSet):
         else:
             return self._delete(ShoppingList, request.user, pk)
 
-    @action(detail=False, methods=["get"],
+    @action(detail=False, methods=['post', 'delete'], url_path='favorite',
             permission_classes=[IsAuthenticated])
+    def favorite_batch(self, request):
+        return self._batch(Favorite, request)
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='shopping_cart', permission_classes=[IsAuthenticated])
+    def shopping_cart_batch(self, request):
+        return self._batch(ShoppingList, request)
+
+    @action(detail=False, methods=["get"],
+            permission_classes=[IsAuthenticated],
+            renderer_classes=(ShoppingCartTextRenderer,
+                              ShoppingCartCSVRenderer,
+                              ShoppingCartPDFRenderer))
     def download_shopping_cart(self, request):
-        cart = request.user.shopping_cart.all()
-        filename = "shop_list.txt"
-        shop_list = {}
-
-        for item in cart:
-            ingredients = RecipeIngredient.objects.filter(recipe=item.recipe)
-            for ingredient in ingredients:
-                name = ingredient.ingredient.name
-                measurement_unit = ingredient.ingredient.measurement_unit
-                amount = ingredient.amount
-
-                if name not in shop_list:
-                    shop_list[name] = {
-                        'amount': amount,
-                        'measurement_unit': measurement_unit,
-                    }
-                else:
-                    shop_list[name]['amount'] = (shop_list[name]['amount']
-                                                 + amount)
-
-        download_list = []
-        for item in shop_list:
-            download_list.append(f'{item} - '
-                                 f'{shop_list[item]["amount"]} '
-                                 f'{shop_list[item]["measurement_unit"]}.\n')
-
-        response = HttpResponse(download_list, 'Content-Type: text/plain')
-        response['Content-Disposition'] = f'attachment; filename={filename}'
+        """
+        Выгружает список покупок в формате txt, csv или pdf.
+
+        Количество ингредиентов читается из сводки списка покупок,
+        строки отдаются клиенту по мере чтения.
+        """
+        ingredients = get_summary(request.user)
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients.iterator()),
+            content_type=renderer.media_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename={renderer.filename}.{renderer.format}')
         return response
 
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_summary(self, request):
+        """
+        Суммарное количество ингредиентов в списке покупок.
+
+        Читается из сводки, которую поддерживают сигналы списка покупок
+        и ингредиентов рецептов, одной выборкой по индексу. Пока сводка
+        пользователя не собрана, количество суммируется по рецептам.
+        """
+        serializer = ShoppingCartIngredientSerializer(
+            get_summary(request.user), many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated],
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        """
+        Лента рецептов авторов, на которых подписан пользователь.
+
+        Рецепты читаются из заранее разложенной таблицы ленты, рецепты
+        популярных авторов дописываются в неё при открытии первой страницы.
+        Первая страница читается из основной базы: дописанных записей
+        на репликах ещё может не быть.
+        """
+        if self.paginator.cursor_query_param in request.query_params:
+            return self.get_feed_page(request)
+        with use_primary():
+            pull(request.user)
+            return self.get_feed_page(request)
+
+    def get_feed_page(self, request):
+        page = self.paginate_queryset(
+            self.get_queryset().feed(request.user))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def by_ingredients(self, request):
+        """
+        Подбирает рецепты по ингредиентам, которые есть у пользователя.
+
+        Рецепты ранжируются по обратному индексу в памяти: сначала
+        с наименьшим числом недостающих ингредиентов.
+        """
+        try:
+            have = {int(pk)
+                    for value in request.query_params.getlist('have')
+                    for pk in value.split(',') if pk.strip()}
+        except ValueError:
+            raise ValidationError(
+                {'have': 'Ожидаются id ингредиентов через запятую.'})
+        if not have:
+            raise ValidationError(
+                {'have': 'Укажите хотя бы один ингредиент.'})
+
+        covered = recipe_index.cover(have, get_positive_int(
+            request, 'limit', settings.BY_INGREDIENTS_LIMIT))
+        recipes = Recipe.objects.in_bulk(
+            [recipe_id for recipe_id, _, _ in covered])
+        result = []
+        for recipe_id, matched, missing in covered:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.matched = matched
+                recipe.missing = ingredient_index.get_many(missing)
+                result.append(recipe)
+        serializer = RecipeCoverageSerializer(
+            result, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
+    def _batch(self, model, request):
+        """
+        Добавляет в избранное или список покупок (model) несколько
+        рецептов либо удаляет их оттуда, возвращая статус каждого id.
+
+        id проверяются одним запросом вместе с текущим членством под
+        блокировкой пользователя (lock_user), поэтому добавленные
+        и удалённые рецепты — разница с прочитанным членством. Запись
+        выполняется одним bulk_create или одним DELETE без построчных
+        сигналов: счётчики, кеш членства и сводку списка покупок
+        обновляют получатели сигнала memberships_changed.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(
+            serializer.validated_data['recipes']))
+        user = request.user
+
+        with transaction.atomic():
+            lock_user(user.id)
+            members = dict(Recipe.objects.filter(
+                pk__in=recipe_ids
+            ).annotate(is_member=Exists(model.objects.filter(
+                user=user, recipe=OuterRef('pk')))
+            ).values_list('id', 'is_member'))
+            added, removed = [], []
+            if request.method == 'POST':
+                added = [pk for pk in recipe_ids
+                         if members.get(pk) is False]
+                model.objects.bulk_create(
+                    [model(user=user, recipe_id=pk) for pk in added],
+                    ignore_conflicts=True)
+                statuses = {True: 'exists', False: 'added'}
+            else:
+                removed = [pk for pk in recipe_ids if members.get(pk)]
+                if removed:
+                    delete_without_signals(model.objects.filter(
+                        user=user, recipe_id__in=removed))
+                statuses = {True: 'removed', False: 'absent'}
+            memberships_changed.send(
+                sender=model, user_id=user.id, added=added, removed=removed)
+
+        return Response({'results': [
+            {'id': pk, 'status': statuses.get(members.get(pk), 'not_found')}
+            for pk in recipe_ids]})
+
     def _add(self, model, user, pk):
-        if model.objects.filter(user=user, recipe__id=pk).exists():
+        recipe = get_object_or_404(Recipe, id=pk)
+        with transaction.atomic():
+            lock_user(user.id)
+            _, created = model.objects.get_or_create(
+                user=user, recipe=recipe)
+        if not created:
             return Response({'errors': 'Рецепт уже добавлен!'},
                             status=status.HTTP_400_BAD_REQUEST)
-        recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
         serializer = RecipeSchemeSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def _delete(self, model, user, pk):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
+        with transaction.atomic():
+            lock_user(user.id)
+            deleted, _ = model.objects.filter(
+                user=user, recipe__id=pk).delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({'errors': 'Рецепт уже удален!'},
                         status=status.HTTP_400_BAD_REQUEST)
 
 
-class IngredientViewSet(ModelViewSet):
+class IngredientViewSet(ReplicaReadMixin, VersionedCacheMixin,
+                        ModelViewSet):
+    cache_version_name = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
-    filter_backends = [DjangoFilterBackend, ]
-    filter_class = IngredientFilter
+
+    def get_list_data(self, request, *args, **kwargs):
+        """Ищет ингредиенты по индексу в памяти, не обращаясь к базе."""
+        name = request.query_params.get('name')
+        if name is None:
+            ingredients = ingredient_index.all(
+                get_positive_int(request, 'limit', None))
+        else:
+            ingredients = ingredient_index.search(
+                name, get_positive_int(request, 'limit',
+                                       settings.INGREDIENTS_SEARCH_LIMIT))
+        return self.get_serializer(ingredients, many=True).data
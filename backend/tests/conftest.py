@@ -0,0 +1,68 @@
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from rest_framework.request import Request
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingList, Tag)
+from users.models import Follow, User
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        email='reader@example.com', username='reader',
+        first_name='Читатель', last_name='Рецептов', password='pw123456xx')
+
+
+@pytest.fixture
+def author(db):
+    return User.objects.create_user(
+        email='author@example.com', username='author',
+        first_name='Автор', last_name='Рецептов', password='pw123456xx')
+
+
+@pytest.fixture
+def recipes(user, author):
+    """Рецепты двух авторов с тегами, ингредиентами и отметками user."""
+    tags = [Tag.objects.create(name='Завтрак', color='#FF0000',
+                               slug='breakfast'),
+            Tag.objects.create(name='Обед', color='#00FF00', slug='lunch')]
+    ingredients = [
+        Ingredient.objects.create(name=f'ингредиент {number}',
+                                  measurement_unit='г')
+        for number in range(5)]
+    recipes = []
+    for number in range(6):
+        recipe = Recipe.objects.create(
+            author=author if number % 2 else user,
+            name=f'Рецепт {number} "в кавычках" \\  ',
+            text='Описание', cooking_time=number + 1)
+        recipe.tags.set(tags[:number % 2 + 1])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=number + 1.5)
+            for ingredient in ingredients[number % 3:number % 3 + 3])
+        recipes.append(recipe)
+    Recipe.objects.filter(pk=recipes[0].pk).update(
+        image='recipes/images/фото 1.png', renditions_ready=True)
+    Recipe.objects.filter(pk=recipes[1].pk).update(
+        image='recipes/images/photo.png')
+    Favorite.objects.create(user=user, recipe=recipes[1])
+    ShoppingList.objects.create(user=user, recipe=recipes[1])
+    ShoppingList.objects.create(user=user, recipe=recipes[2])
+    Follow.objects.create(user=user, following=author)
+    return recipes
+
+
+@pytest.fixture(params=['anonymous', 'user'])
+def api_request(request, rf, user):
+    """Запрос к списку рецептов от анонима и от пользователя."""
+    api_request = Request(rf.get('/api/recipes/'))
+    api_request.user = user if request.param == 'user' else AnonymousUser()
+    return api_request
@@ -0,0 +1,68 @@
+"""
+Быстрые сериализаторы с ORJSONRenderer отдают те же байты,
+что RecipeViewSerializer с JSONRenderer.
+"""
+import pytest
+from django.http import QueryDict
+from rest_framework.renderers import JSONRenderer
+
+from recipes.fast_serializers import (RECIPE_FIELDS, RecipeRowSerializer,
+                                      recipe_rows)
+from recipes.fieldsets import get_fieldset
+from recipes.models import Recipe
+from recipes.renderers import ORJSONRenderer
+from recipes.serializers import RecipeViewSerializer
+
+FIELDSET_QUERIES = (
+    '',
+    'fields=name,image,cooking_time,tags',
+    'omit=text,ingredients,author',
+    'fields=id,author,is_favorited,renditions&omit=author',
+)
+
+
+def select_fields(data, fieldset):
+    if fieldset is None:
+        return data
+    return {name: value for name, value in data.items() if name in fieldset}
+
+
+def render_model(data, fieldset, many=False):
+    if many:
+        data = [select_fields(item, fieldset) for item in data]
+    else:
+        data = select_fields(data, fieldset)
+    return JSONRenderer().render(data)
+
+
+@pytest.mark.parametrize('query', FIELDSET_QUERIES)
+def test_list_matches_model_serializer(api_request, recipes, query):
+    fieldset = get_fieldset(QueryDict(query), RECIPE_FIELDS)
+    context = {'request': api_request}
+    queryset = Recipe.objects.order_by('-pub_date', '-id')
+
+    expected = render_model(RecipeViewSerializer(
+        queryset.for_view(api_request.user), many=True,
+        context=context).data, fieldset, many=True)
+    rows = recipe_rows(queryset, fieldset or RECIPE_FIELDS)
+    actual = ORJSONRenderer().render(RecipeRowSerializer(
+        rows, many=True, context=context, fields=fieldset).data)
+
+    assert actual == expected
+
+
+@pytest.mark.parametrize('query', FIELDSET_QUERIES)
+def test_detail_matches_model_serializer(api_request, recipes, query):
+    fieldset = get_fieldset(QueryDict(query), RECIPE_FIELDS)
+    context = {'request': api_request}
+
+    for recipe in recipes[:3]:
+        queryset = Recipe.objects.filter(pk=recipe.pk)
+        expected = render_model(RecipeViewSerializer(
+            queryset.for_view(api_request.user).get(),
+            context=context).data, fieldset)
+        row = recipe_rows(queryset, fieldset or RECIPE_FIELDS).get()
+        actual = ORJSONRenderer().render(RecipeRowSerializer(
+            row, context=context, fields=fieldset).data)
+
+        assert actual == expected
@@ -0,0 +1,30 @@
+"""
+PDF списка покупок строится шрифтом с кириллицей, а без шрифта
+рендерер падает до начала ответа.
+"""
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+
+from recipes.renderers import ShoppingCartPDFRenderer, ShoppingCartRenderer
+
+INGREDIENTS = [{'name': 'Картофель', 'total': 2.5, 'measurement_unit': 'кг'}]
+
+
+def test_pdf_embeds_bundled_font():
+    content = b''.join(ShoppingCartPDFRenderer().stream(iter(INGREDIENTS)))
+    assert content.startswith(b'%PDF')
+    assert b'DejaVuSans' in content
+
+
+def test_pdf_without_font_fails_before_streaming(settings, tmp_path):
+    class Renderer(ShoppingCartPDFRenderer):
+        font_name = 'MissingShoppingCartFont'
+
+    settings.SHOPPING_CART_PDF_FONT = str(tmp_path / 'missing.ttf')
+    with pytest.raises(ImproperlyConfigured):
+        Renderer().stream(iter(INGREDIENTS))
+
+
+def test_base_renderer_is_abstract():
+    with pytest.raises(TypeError):
+        ShoppingCartRenderer()
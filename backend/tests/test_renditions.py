@@ -0,0 +1,39 @@
+"""
+Готовые уменьшенные копии меняют ETag рецепта и сбрасывают
+закешированные ответы.
+"""
+from io import BytesIO
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.images import generate_renditions
+from recipes.models import Recipe
+
+
+@pytest.fixture
+def image_recipe(transactional_db, settings, tmp_path, author):
+    settings.MEDIA_ROOT = str(tmp_path)
+    buffer = BytesIO()
+    Image.new('RGB', (320, 240), 'red').save(buffer, 'PNG')
+    name = default_storage.save(
+        'recipes/images/photo.png', ContentFile(buffer.getvalue()))
+    return Recipe.objects.create(
+        author=author, name='Рецепт', text='Описание', cooking_time=1,
+        image=name)
+
+
+def test_renditions_change_etag(image_recipe):
+    client = APIClient()
+    url = f'/api/recipes/{image_recipe.pk}/'
+    response = client.get(url)
+    assert response.data['renditions'] is None
+
+    generate_renditions(image_recipe.pk, image_recipe.image.name)
+
+    response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.status_code == 200
+    assert response.data['renditions'] is not None
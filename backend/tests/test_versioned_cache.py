@@ -0,0 +1,21 @@
+"""
+ETag справочников не совпадает со старым после потери счётчика
+версий в кеше.
+"""
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from recipes.models import Tag
+
+
+def test_etag_survives_version_reset(db):
+    client = APIClient()
+    Tag.objects.create(name='Завтрак', color='#FF0000', slug='breakfast')
+    etag = client.get('/api/tags/')['ETag']
+
+    cache.clear()
+    Tag.objects.create(name='Обед', color='#00FF00', slug='lunch')
+
+    response = client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert len(response.data) == 2
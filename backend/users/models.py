@@ -8,12 +8,28 @@ class User(AbstractUser):
     email = models.EmailField(max_length=254, unique=True)
     first_name = models.CharField(max_length=150)
     last_name = models.CharField(max_length=150)
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False)
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False)
+    shopping_cart_summary_ready = models.BooleanField(
+        verbose_name='Сводка списка покупок собрана',
+        default=False,
+        editable=False)
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
     USERNAME_FIELD = 'email'
 
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
+        indexes = [
+            models.Index(fields=['date_joined', 'id'],
+                         name='user_date_joined_id_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.username
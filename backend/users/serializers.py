@@ -2,6 +2,8 @@ from django.core.exceptions import ValidationError
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 
+from recipes.fieldsets import SparseFieldsetSerializerMixin
+from recipes.images import rendition_urls
 from recipes.models import Recipe
 from .models import Follow, User
 
@@ -34,13 +36,17 @@ class UserCreateSerializer(UserCreateSerializer):
                   'last_name', 'password')
 
 
-class UserDetailSerializer(serializers.ModelSerializer):
+class UserDetailSerializer(SparseFieldsetSerializerMixin,
+                           serializers.ModelSerializer):
     """Сериализатор для пользователя."""
     is_subscribed = serializers.SerializerMethodField(
         method_name='get_is_subscribed'
     )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+
         user = self.context['request'].user
 
         if user.is_anonymous:
@@ -55,40 +61,24 @@ class UserDetailSerializer(serializers.ModelSerializer):
 
 
 class RecipeSchemeSerializer(serializers.ModelSerializer):
+    renditions = serializers.SerializerMethodField(
+        method_name='get_renditions')
+
+    def get_renditions(self, obj):
+        return rendition_urls(obj, self.context.get('request'))
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
-
-
-class FollowSerializer(serializers.ModelSerializer):
-    id = serializers.ReadOnlyField(source='following.id')
-    email = serializers.ReadOnlyField(source='following.email')
-    username = serializers.ReadOnlyField(source='following.username')
-    first_name = serializers.ReadOnlyField(source='following.first_name')
-    last_name = serializers.ReadOnlyField(source='following.last_name')
-    is_subscribed = serializers.SerializerMethodField(
-        method_name='get_is_subscribed')
-    recipes = serializers.SerializerMethodField(
-        method_name='get_recipes')
-    recipes_count = serializers.SerializerMethodField(
-        method_name='get_recipes_count')
-
-    def get_is_subscribed(self, obj):
-        return Follow.objects.filter(
-            user=obj.user,
-            following=obj.following
-        ).exists()
+        fields = ('id', 'name', 'image', 'renditions', 'cooking_time')
 
-    def get_recipes(self, obj):
-        recipes = Recipe.objects.filter(author=obj.following.id)
-        serializer = RecipeSchemeSerializer(recipes, many=True)
-        return serializer.data
 
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.following.id).count()
+class SubscriptionSerializer(UserDetailSerializer):
+    """Сериализатор автора из подписок пользователя с его рецептами."""
+    recipes = RecipeSchemeSerializer(
+        source='latest_recipes', many=True, read_only=True)
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
-        model = Follow
-        fields = ['email', 'id', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'recipes', 'recipes_count']
+        model = User
+        fields = ('email', 'id', 'username', 'first_name', 'last_name',
+                  'is_subscribed', 'recipes', 'recipes_count')
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.signals import counter_delta, shift_counter
+from .models import Follow, User
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def update_followers_count(signal, instance, created=False, **kwargs):
+    """Поддерживает счётчик подписчиков у автора."""
+    delta = counter_delta(signal, created)
+    if delta:
+        User.objects.filter(pk=instance.following_id).update(
+            followers_count=shift_counter('followers_count', delta))
@@ -1,18 +1,73 @@
 from djoser.views import UserViewSet
+from django.db.models import (BooleanField, OuterRef, Prefetch, Subquery,
+                              Value)
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
 
+from config.db_router import ReplicaReadMixin
 from .models import User, Follow
-from .serializers import UserDetailSerializer, FollowSerializer
-from recipes.pagination import CustomPagination
+from .serializers import UserDetailSerializer, SubscriptionSerializer
+from recipes.fieldsets import SparseFieldsetMixin
+from recipes.models import Recipe, is_subscribed
+from recipes.pagination import UserPagination
 
+USER_COLUMNS = ('username', 'first_name', 'last_name', 'email',
+                'recipes_count')
 
-class CustomUserViewSet(UserViewSet):
+
+def user_columns(fields):
+    """Столбцы пользователя, нужные для вывода полей fields."""
+    return ('id', *(name for name in USER_COLUMNS if name in fields))
+
+
+class CustomUserViewSet(ReplicaReadMixin, SparseFieldsetMixin, UserViewSet):
     queryset = User.objects.all().order_by('-date_joined')
-    pagination_class = CustomPagination
+    pagination_class = UserPagination
+    fieldset_fields = UserDetailSerializer.Meta.fields
+    fieldset_actions = ('list', 'retrieve', 'me', 'subscriptions')
+
+    def get_fieldset_fields(self):
+        if self.action == 'subscriptions':
+            return SubscriptionSerializer.Meta.fields
+        return self.fieldset_fields
+
+    def get_queryset(self):
+        """
+        Для чтения пользователей загружает только столбцы выбранных полей.
+        Подписка на одного пользователя вычисляется в том же запросе.
+        """
+        queryset = super().get_queryset()
+        if (self.action not in ('list', 'retrieve')
+                or self.request.method not in SAFE_METHODS):
+            return queryset
+        fields = self.get_fieldset() or self.fieldset_fields
+        if self.action == 'retrieve' and 'is_subscribed' in fields:
+            queryset = queryset.annotate(
+                is_subscribed=is_subscribed(self.request.user))
+        return queryset.only(*user_columns(fields))
+
+    def paginate_queryset(self, queryset):
+        """
+        Отмечает подписки на пользователей страницы списка одним запросом,
+        не усложняя подсчёт общего количества.
+        """
+        page = super().paginate_queryset(queryset)
+        fields = self.get_fieldset() or self.fieldset_fields
+        if page is None or self.action != 'list' or (
+                'is_subscribed' not in fields):
+            return page
+        user = self.request.user
+        followed = set()
+        if user.is_authenticated:
+            followed = set(Follow.objects.filter(
+                user=user, following__in=[author.id for author in page]
+            ).order_by().values_list('following_id', flat=True))
+        for author in page:
+            author.is_subscribed = author.id in followed
+        return page
 
     @action(methods=['get', 'patch'], detail=False,
             permission_classes=(IsAuthenticated,))
@@ -20,7 +75,8 @@ class CustomUserViewSet(UserViewSet):
         """Выводит информацию о пользователе"""
 
         serializer = UserDetailSerializer(
-            request.user, context={'request': request})
+            request.user, context={'request': request},
+            fields=self.get_fieldset())
         if request.method == 'PATCH':
             serializer = UserDetailSerializer(
                 request.user,
@@ -31,17 +87,53 @@ class CustomUserViewSet(UserViewSet):
             serializer.save()
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    def get_recipes_limit(self):
+        """Возвращает положительный recipes_limit из запроса или None."""
+        try:
+            limit = int(self.request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            return None
+        return limit if limit > 0 else None
+
     @action(detail=False, permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
-        """Выводит информацию о подписках"""
-        queryset = Follow.objects.filter(user=request.user)
-        if queryset:
-            pages = self.paginate_queryset(queryset)
-            serializer = FollowSerializer(pages, many=True,
-                                          context={'request': request})
-            return self.get_paginated_response(serializer.data)
-        return Response('У Вас нет подписок.',
-                        status=status.HTTP_400_BAD_REQUEST)
+        """
+        Выводит информацию о подписках.
+
+        Число рецептов автора хранится в профиле, а последние recipes_limit
+        рецептов каждого автора выбираются одним коррелированным
+        подзапросом, поэтому страница стоит фиксированное число запросов.
+        Если поле recipes не выбрано, рецепты не подгружаются.
+        """
+        queryset = User.objects.filter(followed__user=request.user)
+        if not queryset.exists():
+            return Response('У Вас нет подписок.',
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        fieldset = self.get_fieldset()
+        fields = fieldset or SubscriptionSerializer.Meta.fields
+        queryset = queryset.only(*user_columns(fields)).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('-date_joined', '-id')
+
+        if 'recipes' in fields:
+            recipes = Recipe.objects.only(
+                'id', 'name', 'image', 'renditions_ready', 'cooking_time',
+                'author')
+            limit = self.get_recipes_limit()
+            if limit is not None:
+                latest = Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).order_by('-pub_date', '-id').values('id')[:limit]
+                recipes = recipes.filter(id__in=Subquery(latest))
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipes', queryset=recipes, to_attr='latest_recipes'))
+
+        pages = self.paginate_queryset(queryset)
+        serializer = SubscriptionSerializer(pages, many=True,
+                                            context={'request': request},
+                                            fields=fieldset)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=('post',),
             permission_classes=(IsAuthenticated,))